@@ -0,0 +1,100 @@
+# Per-tick cost of computing a game's METRICS resources.
+#
+# Compares the old approach (walk every pod and re-parse every quantity on
+# each tick) with ResourceIndex (incremental per-pod slots, one cached pass)
+# for games of 10, 100 and 1000 pods.
+#
+# Run from the backend directory:  python -m benchmarks.bench_resources
+import random
+import timeit
+from types import SimpleNamespace
+
+from common.resources import ResourceIndex
+
+SIZES = (10, 100, 1000)
+
+
+def make_pod(game_id: str, index: int):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=f"snake-{game_id}-{index}", labels={"app": "snake", "game_id": game_id}),
+        spec=SimpleNamespace(containers=[SimpleNamespace(
+            resources=SimpleNamespace(limits={"cpu": "100m", "memory": "24Mi"})
+        )]),
+        status=SimpleNamespace(phase="Running"),
+    )
+
+
+def make_usage(pods):
+    return {pod.metadata.name: [{"cpu": f"{random.randint(1, 90) * 1000000}n",
+                                 "memory": f"{random.randint(4000, 20000)}Ki"}]
+            for pod in pods}
+
+
+# The pre-ResourceIndex per-tick loop, kept here as the baseline
+def legacy_totals(pods, usage):
+    total_cpu_usage = total_memory_usage = total_cpu_limit = total_memory_limit = 0.0
+    running = 0
+    for pod in pods:
+        if pod.status.phase != "Running":
+            continue
+        running += 1
+        limits = pod.spec.containers[0].resources.limits
+        cpu = str(limits["cpu"])
+        total_cpu_limit += float(cpu[:-1]) / 1000.0 if cpu.endswith("m") else float(cpu)
+        memory = str(limits["memory"])
+        if memory.endswith("Mi"):
+            total_memory_limit += float(memory[:-2]) * 1024 * 1024
+        elif memory.endswith("Ki"):
+            total_memory_limit += float(memory[:-2]) * 1024
+        else:
+            total_memory_limit += float(memory)
+        for container in usage.get(pod.metadata.name, []):
+            cpu = container["cpu"]
+            if cpu.endswith("n"):
+                total_cpu_usage += float(cpu[:-1]) / 1e9
+            elif cpu.endswith("m"):
+                total_cpu_usage += float(cpu[:-1]) / 1e3
+            else:
+                total_cpu_usage += float(cpu)
+            memory = container["memory"]
+            if memory.endswith("Ki"):
+                total_memory_usage += float(memory[:-2]) * 1024
+            elif memory.endswith("Mi"):
+                total_memory_usage += float(memory[:-2]) * 1024 * 1024
+            else:
+                total_memory_usage += float(memory)
+    return running, total_cpu_usage, total_memory_usage, total_cpu_limit, total_memory_limit
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"{'pods':>6} {'legacy/tick':>14} {'index/tick':>14} {'index/tick+change':>19}")
+    for size in SIZES:
+        game_id = f"bench{size}"
+        pods = [make_pod(game_id, i) for i in range(size)]
+        usage = make_usage(pods)
+
+        index = ResourceIndex()
+        for pod in pods:
+            index.on_pod_event("ADDED", pod)
+        index.on_metrics({game_id: usage})
+
+        number = max(10, 20000 // size)
+        legacy = per_call_us(lambda: legacy_totals(pods, usage), number)
+        cached = per_call_us(lambda: index.totals(game_id), number * 10)
+
+        # Worst case: a pod changed since the last tick, forcing one full pass
+        churn = pods[0]
+        def changed():
+            index.on_pod_event("MODIFIED", churn)
+            return index.totals(game_id)
+        recomputed = per_call_us(changed, number)
+
+        print(f"{size:>6} {legacy:>12.1f}us {cached:>12.2f}us {recomputed:>17.1f}us")
+
+
+if __name__ == "__main__":
+    main()
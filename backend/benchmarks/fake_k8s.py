@@ -0,0 +1,327 @@
+# Minimal in-memory stand-in for the Kubernetes API server.
+#
+# Serves just enough of core/v1, apps/v1, autoscaling/v2, networking/v1 and
+# metrics.k8s.io for the Chaos Arena backend: LIST/WATCH of pods (with
+# resourceVersion resume, bookmarks and 410 Gone), create/delete and
+# deletecollection for the per-game resources, and pod metrics. Deployments
+# get a tiny controller that keeps the requested number of pods running.
+# It also answers /snake/{game_id} so generated load has somewhere to go.
+#
+# Run standalone:  python -m benchmarks.fake_k8s --port 18080
+import argparse
+import asyncio
+import bisect
+import copy
+import json
+import random
+import string
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+GROUPS = "api/v1|apis/apps/v1|apis/autoscaling/v2|apis/networking.k8s.io/v1"
+
+KINDS = {
+    ("api/v1", "pods"): "PodList",
+    ("api/v1", "services"): "ServiceList",
+    ("apis/apps/v1", "deployments"): "DeploymentList",
+    ("apis/autoscaling/v2", "horizontalpodautoscalers"): "HorizontalPodAutoscalerList",
+    ("apis/networking.k8s.io/v1", "ingresses"): "IngressList",
+}
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _status(code: int, reason: str) -> Dict:
+    return {"kind": "Status", "apiVersion": "v1", "status": "Failure", "code": code, "reason": reason, "message": reason}
+
+
+def _terms(selector: str) -> List[str]:
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(selector):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            terms.append(selector[start:i])
+            start = i + 1
+    terms.append(selector[start:])
+    return [term.strip() for term in terms if term.strip()]
+
+
+# Equality, set-based (key in (a,b)) and existence label selectors
+def matches(labels: Dict, selector: Optional[str]) -> bool:
+    if not selector:
+        return True
+    for term in _terms(selector):
+        if " in " in term:
+            key, values = term.split(" in ", 1)
+            if labels.get(key.strip()) not in {value.strip() for value in values.strip("() ").split(",")}:
+                return False
+        elif "=" in term:
+            key, value = term.split("=", 1)
+            if labels.get(key.strip()) != value.strip():
+                return False
+        elif term not in labels:
+            return False
+    return True
+
+
+class FakeCluster:
+    def __init__(self, pod_start_delay: float = 0.2, history: int = 10000):
+        self.pod_start_delay = pod_start_delay
+        self.history = history
+        self.resource_version = 1
+        self.objects: Dict[str, Dict[str, Dict]] = {resource: {} for _, resource in KINDS}
+        # Event log for watches, ordered by resourceVersion
+        self.events: List[Dict] = []
+        self.event_versions: List[int] = []
+        self.changed = asyncio.Condition()
+        self.requests: Dict[str, int] = {}
+
+    def count(self, verb: str, resource: str):
+        key = f"{verb} {resource}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    async def emit(self, resource: str, event_type: str, obj: Dict):
+        self.resource_version += 1
+        obj["metadata"]["resourceVersion"] = str(self.resource_version)
+        self.events.append({"resource": resource, "type": event_type, "object": copy.deepcopy(obj)})
+        self.event_versions.append(self.resource_version)
+        if len(self.events) > self.history:
+            drop = len(self.events) - self.history
+            del self.events[:drop]
+            del self.event_versions[:drop]
+        async with self.changed:
+            self.changed.notify_all()
+
+    def select(self, resource: str, selector: Optional[str]) -> List[Dict]:
+        return [obj for obj in self.objects[resource].values()
+                if matches(obj["metadata"].get("labels") or {}, selector)]
+
+    async def create(self, resource: str, namespace: str, body: Dict) -> Dict:
+        metadata = body.setdefault("metadata", {})
+        if metadata.get("name") in self.objects[resource]:
+            raise web.HTTPConflict(text=json.dumps(_status(409, "AlreadyExists")), content_type="application/json")
+        metadata.update(namespace=namespace, uid=str(uuid.uuid4()), creationTimestamp=_now())
+        metadata.setdefault("labels", {})
+        self.objects[resource][metadata["name"]] = body
+        await self.emit(resource, "ADDED", body)
+        if resource == "deployments":
+            asyncio.create_task(self.reconcile(metadata["name"]))
+        return body
+
+    async def delete(self, resource: str, name: str) -> Dict:
+        obj = self.objects[resource].pop(name, None)
+        if obj is None:
+            raise web.HTTPNotFound(text=json.dumps(_status(404, "NotFound")), content_type="application/json")
+        await self.emit(resource, "DELETED", obj)
+        game_id = (obj["metadata"].get("labels") or {}).get("game_id")
+        if resource == "pods":
+            # Deployment controller replaces deleted pods
+            for deployment in self.select("deployments", f"game_id={game_id}"):
+                asyncio.create_task(self.reconcile(deployment["metadata"]["name"]))
+        elif resource == "deployments":
+            # Garbage collect the deployment's pods
+            for pod in self.select("pods", f"game_id={game_id}"):
+                self.objects["pods"].pop(pod["metadata"]["name"], None)
+                await self.emit("pods", "DELETED", pod)
+        return {"kind": "Status", "apiVersion": "v1", "status": "Success"}
+
+    async def reconcile(self, name: str):
+        deployment = self.objects["deployments"].get(name)
+        if not deployment:
+            return
+        template = deployment["spec"]["template"]
+        labels = template["metadata"]["labels"]
+        selector = ",".join(f"{key}={value}" for key, value in labels.items())
+        missing = deployment["spec"].get("replicas", 1) - len(self.select("pods", selector))
+        for _ in range(missing):
+            suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=5))
+            pod = {
+                "apiVersion": "v1",
+                "kind": "Pod",
+                "metadata": {"name": f"{name}-{suffix}", "labels": dict(labels)},
+                "spec": copy.deepcopy(template["spec"]),
+                "status": {"phase": "Pending"},
+            }
+            await self.create("pods", deployment["metadata"]["namespace"], pod)
+            asyncio.create_task(self.start_pod(pod["metadata"]["name"]))
+
+    async def start_pod(self, name: str):
+        await asyncio.sleep(self.pod_start_delay)
+        pod = self.objects["pods"].get(name)
+        if pod:
+            pod["status"]["phase"] = "Running"
+            await self.emit("pods", "MODIFIED", pod)
+
+    def events_since(self, version: int) -> List[Dict]:
+        return self.events[bisect.bisect_right(self.event_versions, version):]
+
+    def too_old(self, version: int) -> bool:
+        return bool(self.event_versions) and version < self.event_versions[0] - 1
+
+
+def pod_metrics(pod: Dict) -> Dict:
+    metadata = pod["metadata"]
+    return {
+        "metadata": {"name": metadata["name"], "namespace": metadata.get("namespace"),
+                     "labels": metadata.get("labels", {})},
+        "timestamp": _now(),
+        "window": "15s",
+        "containers": [
+            {"name": container.get("name", "snake"),
+             "usage": {"cpu": f"{random.randint(1, 90) * 1000000}n",
+                       "memory": f"{random.randint(4000, 20000)}Ki"}}
+            for container in pod["spec"].get("containers", [])
+        ],
+    }
+
+
+def build_app(cluster: FakeCluster) -> web.Application:
+    routes = web.RouteTableDef()
+
+    def resource_of(request: web.Request) -> str:
+        key = (request.match_info["group"], request.match_info["resource"])
+        if key not in KINDS:
+            raise web.HTTPNotFound(text=json.dumps(_status(404, "NotFound")), content_type="application/json")
+        return key[1]
+
+    @routes.get(f"/{{group:{GROUPS}}}/namespaces/{{ns}}/{{resource}}")
+    async def list_or_watch(request: web.Request):
+        resource = resource_of(request)
+        selector = request.query.get("labelSelector")
+        if request.query.get("watch") in ("true", "True", "1"):
+            cluster.count("WATCH", resource)
+            return await watch(request, resource, selector)
+        cluster.count("LIST", resource)
+        return web.json_response({
+            "kind": KINDS[(request.match_info["group"], resource)],
+            "apiVersion": "v1",
+            "metadata": {"resourceVersion": str(cluster.resource_version)},
+            "items": cluster.select(resource, selector),
+        })
+
+    async def watch(request: web.Request, resource: str, selector: Optional[str]):
+        version = int(request.query.get("resourceVersion") or cluster.resource_version)
+        deadline = time.monotonic() + float(request.query.get("timeoutSeconds") or 1800)
+        bookmarks = request.query.get("allowWatchBookmarks") in ("true", "True", "1")
+
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        await response.prepare(request)
+
+        async def send(event: Dict):
+            await response.write((json.dumps(event) + "\n").encode())
+
+        if cluster.too_old(version):
+            await send({"type": "ERROR", "object": _status(410, "Expired")})
+            return response
+
+        last_bookmark = time.monotonic()
+        while time.monotonic() < deadline:
+            for event in cluster.events_since(version):
+                version = int(event["object"]["metadata"]["resourceVersion"])
+                if event["resource"] == resource and matches(event["object"]["metadata"].get("labels") or {}, selector):
+                    await send({"type": event["type"], "object": event["object"]})
+            if bookmarks and time.monotonic() - last_bookmark >= 5:
+                last_bookmark = time.monotonic()
+                await send({"type": "BOOKMARK", "object": {
+                    "kind": "Pod", "apiVersion": "v1", "metadata": {"resourceVersion": str(version)}}})
+            try:
+                async with cluster.changed:
+                    await asyncio.wait_for(cluster.changed.wait(), timeout=max(0.01, min(1.0, deadline - time.monotonic())))
+            except asyncio.TimeoutError:
+                pass
+        return response
+
+    @routes.post(f"/{{group:{GROUPS}}}/namespaces/{{ns}}/{{resource}}")
+    async def create(request: web.Request):
+        resource = resource_of(request)
+        cluster.count("CREATE", resource)
+        obj = await cluster.create(resource, request.match_info["ns"], await request.json())
+        return web.json_response(obj, status=201)
+
+    @routes.delete(f"/{{group:{GROUPS}}}/namespaces/{{ns}}/{{resource}}/{{name}}")
+    async def delete(request: web.Request):
+        resource = resource_of(request)
+        cluster.count("DELETE", resource)
+        return web.json_response(await cluster.delete(resource, request.match_info["name"]))
+
+    @routes.delete(f"/{{group:{GROUPS}}}/namespaces/{{ns}}/{{resource}}")
+    async def delete_collection(request: web.Request):
+        resource = resource_of(request)
+        cluster.count("DELETECOLLECTION", resource)
+        for obj in cluster.select(resource, request.query.get("labelSelector")):
+            await cluster.delete(resource, obj["metadata"]["name"])
+        return web.json_response({"kind": "Status", "apiVersion": "v1", "status": "Success"})
+
+    @routes.get("/apis/metrics.k8s.io/v1beta1/namespaces/{ns}/pods")
+    async def list_pod_metrics(request: web.Request):
+        cluster.count("LIST", "pods.metrics.k8s.io")
+        items = [pod_metrics(pod) for pod in cluster.select("pods", request.query.get("labelSelector"))
+                 if pod["status"]["phase"] == "Running"]
+        return web.json_response({"kind": "PodMetricsList", "apiVersion": "metrics.k8s.io/v1beta1",
+                                  "metadata": {}, "items": items})
+
+    @routes.get("/apis/metrics.k8s.io/v1beta1/namespaces/{ns}/pods/{name}")
+    async def get_pod_metrics(request: web.Request):
+        cluster.count("GET", "pods.metrics.k8s.io")
+        pod = cluster.objects["pods"].get(request.match_info["name"])
+        if pod is None:
+            raise web.HTTPNotFound(text=json.dumps(_status(404, "NotFound")), content_type="application/json")
+        return web.json_response(pod_metrics(pod))
+
+    # Stand-in for the per-game ingress that generated load is sent to
+    @routes.get("/snake/{game_id}")
+    async def game(request: web.Request):
+        cluster.count("GET", "snake")
+        return web.Response(text="ok")
+
+    @routes.get("/fake/stats")
+    async def stats(request: web.Request):
+        return web.json_response({
+            "requests": cluster.requests,
+            "objects": {resource: len(objects) for resource, objects in cluster.objects.items()},
+        })
+
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+
+# Kubeconfig pointing at a fake server on localhost
+def kubeconfig(port: int) -> str:
+    return (
+        "apiVersion: v1\n"
+        "kind: Config\n"
+        "clusters:\n"
+        f"- cluster: {{server: \"http://127.0.0.1:{port}\"}}\n"
+        "  name: fake\n"
+        "contexts:\n"
+        "- context: {cluster: fake, user: fake}\n"
+        "  name: fake\n"
+        "current-context: fake\n"
+        "users:\n"
+        "- name: fake\n"
+        "  user: {token: fake}\n"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Kubernetes API server for benchmarks")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--pod-start-delay", type=float, default=0.2)
+    parser.add_argument("--history", type=int, default=10000,
+                        help="Watch events kept for resuming; older resourceVersions get 410 Gone")
+    args = parser.parse_args()
+    web.run_app(build_app(FakeCluster(pod_start_delay=args.pod_start_delay, history=args.history)), port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
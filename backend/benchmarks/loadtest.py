@@ -0,0 +1,438 @@
+# End-to-end load test of the snake API against a fake Kubernetes API.
+#
+# Starts benchmarks.fake_k8s and benchmarks.serve (main.app plus a probe
+# endpoint) as subprocesses, then runs scripted scenarios against them:
+#
+#   init    concurrent POST /init
+#   eat     bursts of POST /eat spread over the games
+#   load    a ramp of POST /load across every game, then GET /load
+#   stream  N concurrent /stream websockets (closing them tears games down)
+#
+# Each scenario reports throughput, p50/p95/p99 latency and errors, plus the
+# server's event-loop lag, thread count and RSS. Results are written as JSON
+# keyed by git commit so runs can be compared across commits.
+#
+# Run from the backend directory:
+#   python -m benchmarks.loadtest run [--games 20 --streams 20 ...]
+#   python -m benchmarks.loadtest run --scenarios init stream --max-loop-lag 0.1
+#   python -m benchmarks.loadtest compare benchmarks/results/<base>.json benchmarks/results/<new>.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from benchmarks.fake_k8s import kubeconfig
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Metrics checked by compare, and whether higher values are better
+COMPARED = (
+    ("throughput_rps", True),
+    ("latency.p50_seconds", False),
+    ("latency.p95_seconds", False),
+    ("latency.p99_seconds", False),
+    ("loop_lag.p99_seconds", False),
+    ("rss_bytes", False),
+    ("threads", False),
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> Tuple[str, bool]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))], 6)
+
+
+class Scenario:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.extra: Dict = {}
+
+    def observe(self, seconds: float, ok: bool):
+        self.latencies.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def result(self, probe: Dict) -> Dict:
+        duration = (self.finished or time.perf_counter()) - self.started
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(len(self.latencies) / duration, 2) if duration > 0 else None,
+            "latency": {
+                "p50_seconds": percentile(self.latencies, 0.50),
+                "p95_seconds": percentile(self.latencies, 0.95),
+                "p99_seconds": percentile(self.latencies, 0.99),
+                "max_seconds": round(max(self.latencies), 6) if self.latencies else None,
+            },
+            "loop_lag": probe.get("loop_lag"),
+            "threads": probe.get("threads"),
+            "rss_bytes": probe.get("rss_bytes"),
+            **self.extra,
+        }
+
+
+class LoadTest:
+    def __init__(self, base_url: str, args):
+        self.base_url = base_url
+        self.args = args
+        self.games: List[str] = []
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.limit = asyncio.Semaphore(args.concurrency)
+
+    async def request(self, scenario: Scenario, method: str, path: str, **kwargs) -> Optional[Dict]:
+        async with self.limit:
+            start = time.perf_counter()
+            try:
+                async with self.session.request(method, self.base_url + path, **kwargs) as response:
+                    body = await response.json(content_type=None)
+                    scenario.observe(time.perf_counter() - start, response.status < 400)
+                    return body if response.status < 400 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                scenario.observe(time.perf_counter() - start, False)
+                return None
+
+    async def probe(self) -> Dict:
+        async with self.session.get(self.base_url + "/bench/probe", params={"reset": "true"}) as response:
+            return await response.json()
+
+    async def run(self) -> Dict:
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as self.session:
+            await self.probe()
+            results = {}
+            for name, scenario in (
+                ("init", self.scenario_init),
+                ("eat", self.scenario_eat),
+                ("load", self.scenario_load),
+                ("stream", self.scenario_stream),
+            ):
+                if name not in self.args.scenarios:
+                    continue
+                print(f"Running {name}...", file=sys.stderr)
+                result = await scenario()
+                result.finish()
+                results[name] = result.result(await self.probe())
+            await self.teardown()
+            return results
+
+    async def scenario_init(self) -> Scenario:
+        scenario = Scenario("init")
+        bodies = await asyncio.gather(*(
+            self.request(scenario, "POST", "/api/snake/init") for _ in range(self.args.games)
+        ))
+        self.games = [body["game_id"] for body in bodies if body and "game_id" in body]
+        return scenario
+
+    async def scenario_eat(self) -> Scenario:
+        scenario = Scenario("eat")
+        if not self.games:
+            return scenario
+        for _ in range(self.args.eat_bursts):
+            await asyncio.gather(*(
+                self.request(scenario, "POST", f"/api/snake/eat/{self.games[i % len(self.games)]}")
+                for i in range(self.args.eat_burst_size)
+            ))
+        return scenario
+
+    async def scenario_load(self) -> Scenario:
+        scenario = Scenario("load")
+        for _ in range(self.args.load_steps):
+            await asyncio.gather(*(self.request(scenario, "POST", f"/api/snake/load/{game_id}")
+                                   for game_id in self.games))
+            await asyncio.sleep(self.args.load_step_seconds)
+        scenario.finish()
+
+        # Achieved vs target rate is read outside the timed window
+        stats = Scenario("load_stats")
+        bodies = await asyncio.gather(*(self.request(stats, "GET", f"/api/snake/load/{game_id}")
+                                        for game_id in self.games))
+        bodies = [body for body in bodies if body]
+        scenario.extra = {
+            "target_rate": round(sum(body.get("target_rate") or 0 for body in bodies), 2),
+            "achieved_rate": round(sum(body.get("achieved_rate") or 0 for body in bodies), 2),
+            "load_errors": sum(body.get("errors") or 0 for body in bodies),
+            "load_dropped": sum(body.get("dropped") or 0 for body in bodies),
+        }
+        return scenario
+
+    async def scenario_stream(self) -> Scenario:
+        # Latency here is time to the first pod event on each socket
+        scenario = Scenario("stream")
+        frames = []
+        if not self.games:
+            return scenario
+        ws_url = self.base_url.replace("http://", "ws://")
+
+        async def stream(game_id: str):
+            start = time.perf_counter()
+            first = None
+            count = 0
+            try:
+                async with self.session.ws_connect(f"{ws_url}/api/snake/stream/{game_id}") as ws:
+                    deadline = start + self.args.stream_seconds
+                    while time.perf_counter() < deadline:
+                        try:
+                            message = await ws.receive(timeout=deadline - time.perf_counter())
+                        except asyncio.TimeoutError:
+                            break
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        count += 1
+                        frame = json.loads(message.data)
+                        if first is None and frame.get("type") in ("ADDED", "MODIFIED", "BATCH"):
+                            first = time.perf_counter() - start
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            scenario.observe(first if first is not None else time.perf_counter() - start, first is not None)
+            frames.append(count)
+
+        await asyncio.gather(*(stream(self.games[i % len(self.games)]) for i in range(self.args.streams)))
+        scenario.extra = {
+            "streams": self.args.streams,
+            "frames": sum(frames),
+            "frames_per_stream_per_second": round(sum(frames) / max(1, len(frames)) / self.args.stream_seconds, 2),
+        }
+        # Closing a stream kills its game
+        self.games = self.games[self.args.streams:]
+        return scenario
+
+    async def teardown(self):
+        scenario = Scenario("kill")
+        await asyncio.gather(*(self.request(scenario, "POST", f"/api/snake/kill/{game_id}")
+                               for game_id in self.games))
+
+
+async def wait_for(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def fake_stats(url: str) -> Dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+
+def run(args) -> Dict:
+    fake_port = args.fake_port or free_port()
+    app_port = args.port or free_port()
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "kubeconfig")
+        with open(config_path, "w") as f:
+            f.write(kubeconfig(fake_port))
+
+        env = dict(os.environ)
+        env.update({
+            "KUBECONFIG": config_path,
+            "DOMAIN": f"127.0.0.1:{fake_port}",
+            "SNAKE_IMAGE": env.get("SNAKE_IMAGE", "bench"),
+            "METRICS_INTERVAL": env.get("METRICS_INTERVAL", "1"),
+            "PYTHONPATH": BACKEND_DIR,
+        })
+        # Keep the in-cluster config from being picked up on a real pod
+        env.pop("KUBERNETES_SERVICE_HOST", None)
+
+        output = None if args.verbose else subprocess.DEVNULL
+        try:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_k8s", "--port", str(fake_port),
+                 "--pod-start-delay", str(args.pod_start_delay)],
+                cwd=BACKEND_DIR, env=env, stdout=output, stderr=output))
+            asyncio.run(wait_for(f"http://127.0.0.1:{fake_port}/fake/stats", 15))
+
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.serve", "--port", str(app_port)],
+                cwd=BACKEND_DIR, env=env, stdout=output, stderr=output))
+            asyncio.run(wait_for(f"http://127.0.0.1:{app_port}/api/ready", 30))
+
+            async def scenarios():
+                return await LoadTest(f"http://127.0.0.1:{app_port}", args).run()
+            results = asyncio.run(scenarios())
+
+            # Stop the app first so teardown on shutdown is counted too
+            app = processes.pop()
+            app.terminate()
+            app.wait(30)
+            kubernetes = asyncio.run(fake_stats(f"http://127.0.0.1:{fake_port}/fake/stats"))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "args": {key: value for key, value in vars(args).items() if key != "func"},
+        "scenarios": results,
+        "kubernetes_requests": kubernetes.get("requests", {}),
+    }
+
+
+def lookup(result: Dict, path: str):
+    for key in path.split("."):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+# Prints a per-scenario table and returns the regressions beyond threshold
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    regressions = []
+    print(f"base {base.get('commit')}{' (dirty)' if base.get('dirty') else ''}  "
+          f"new {new.get('commit')}{' (dirty)' if new.get('dirty') else ''}")
+    print(f"{'scenario':<8} {'metric':<22} {'base':>12} {'new':>12} {'change':>9}")
+    for name, scenario in new.get("scenarios", {}).items():
+        old = base.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED:
+            before, after = lookup(old, metric), lookup(scenario, metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}: {before} -> {after}")
+            print(f"{name:<8} {metric:<22} {before:>12} {after:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+# Scenarios whose server event-loop lag went over an absolute limit
+def over_loop_lag(result: Dict, limit: float) -> List[str]:
+    over = []
+    for name, scenario in result.get("scenarios", {}).items():
+        lag = lookup(scenario, "loop_lag.p99_seconds")
+        if lag is not None and lag > limit:
+            over.append(f"{name} loop_lag.p99_seconds: {lag} > {limit}")
+    return over
+
+
+def cmd_run(args):
+    result = run(args)
+    path = args.output
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{result['commit']}{'-dirty' if result['dirty'] else ''}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result["scenarios"], indent=2))
+    print(f"Wrote {path}", file=sys.stderr)
+    failed = False
+    if args.max_loop_lag is not None:
+        for line in over_loop_lag(result, args.max_loop_lag):
+            print(f"Over limit: {line}", file=sys.stderr)
+            failed = True
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if compare(base, result, args.threshold):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if compare(base, new, args.threshold):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the snake API against a fake Kubernetes API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the scenarios and save the results")
+    run_parser.add_argument("--scenarios", nargs="+", default=["init", "eat", "load", "stream"],
+                            choices=["init", "eat", "load", "stream"])
+    run_parser.add_argument("--games", type=int, default=20)
+    run_parser.add_argument("--concurrency", type=int, default=50, help="max in-flight HTTP requests")
+    run_parser.add_argument("--eat-bursts", type=int, default=5)
+    run_parser.add_argument("--eat-burst-size", type=int, default=100)
+    run_parser.add_argument("--load-steps", type=int, default=5)
+    run_parser.add_argument("--load-step-seconds", type=float, default=1.0)
+    run_parser.add_argument("--streams", type=int, default=20)
+    run_parser.add_argument("--stream-seconds", type=float, default=10.0)
+    run_parser.add_argument("--pod-start-delay", type=float, default=0.2)
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--port", type=int)
+    run_parser.add_argument("--fake-port", type=int)
+    run_parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    run_parser.add_argument("--compare", help="baseline result file to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="relative change flagged as a regression")
+    run_parser.add_argument("--max-loop-lag", type=float,
+                            help="fail if any scenario's p99 event-loop lag is higher (seconds)")
+    run_parser.add_argument("--verbose", action="store_true", help="show server output")
+    run_parser.set_defaults(func=cmd_run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
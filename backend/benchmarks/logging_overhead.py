@@ -0,0 +1,123 @@
+# Per-call cost of logging, as seen by the code doing the logging.
+#
+# Logs the same message through a few handler setups and reports the time
+# spent in logger.info() per call:
+#
+#   sync       StreamHandler writing text straight to the output (the old setup)
+#   queue      the app's pipeline: throttle + context filters, non-blocking
+#              queue handler, JSON written by the listener thread
+#   throttled  the queue pipeline with a per-key rate limit that suppresses
+#              nearly every record
+#   disabled   a level below the logger's, for reference
+#
+# Output goes to a pipe read by a separate process, like stdout in a
+# container, or to a file with --output file. For the queue setups,
+# `drain_ms` is how long the listener then needs to write out what was
+# queued, which no request waits for.
+#
+# Run from the backend directory:  python -m benchmarks.logging_overhead [--calls 100000]
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, IO, Iterator
+
+from common.logger import (TEXT_FORMAT, DATE_FORMAT, ContextFilter, JsonFormatter, NonBlockingQueueHandler,
+                           ThrottleFilter, bind_game, request_id_var, throttle)
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def _time_calls(logger: logging.Logger, calls: int, level: int = logging.INFO, extra: Dict = None) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.log(level, f"Pod abc123 has been eaten ({i})", extra=extra)
+    return time.perf_counter() - start
+
+
+@contextmanager
+def _output(kind: str, tmp: str) -> Iterator[IO]:
+    if kind == "file":
+        with open(os.path.join(tmp, "log"), "w") as out:
+            yield out
+        return
+    reader = subprocess.Popen(["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    try:
+        yield reader.stdin
+    finally:
+        reader.stdin.close()
+        reader.wait()
+
+
+def run_sync(output: str, tmp: str, calls: int) -> Dict:
+    with _output(output, tmp) as out:
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+        elapsed = _time_calls(_logger("sync", handler), calls)
+    return {"us_per_call": round(elapsed / calls * 1e6, 3)}
+
+
+def run_queue(output: str, tmp: str, calls: int, extra: Dict = None, queue_size: int = 0) -> Dict:
+    with _output(output, tmp) as out:
+        log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        writer = logging.StreamHandler(out)
+        writer.setFormatter(JsonFormatter())
+        listener = logging.handlers.QueueListener(log_queue, writer)
+        handler = NonBlockingQueueHandler(log_queue)
+        throttle_filter = ThrottleFilter()
+        handler.addFilter(throttle_filter)
+        handler.addFilter(ContextFilter())
+        listener.start()
+        elapsed = _time_calls(_logger("queue", handler), calls, extra=extra)
+        start = time.perf_counter()
+        listener.stop()
+        drained = time.perf_counter() - start
+    return {
+        "us_per_call": round(elapsed / calls * 1e6, 3),
+        "drain_ms": round(drained * 1000, 1),
+        "dropped": handler.dropped,
+        "suppressed": throttle_filter.suppressed,
+    }
+
+
+def run_disabled(calls: int) -> Dict:
+    elapsed = _time_calls(_logger("disabled", logging.NullHandler()), calls, level=logging.DEBUG)
+    return {"us_per_call": round(elapsed / calls * 1e6, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-call logging overhead")
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--output", choices=["pipe", "file"], default="pipe")
+    parser.add_argument("--queue-size", type=int, default=0, help="bound of the log queue (0: unbounded)")
+    args = parser.parse_args()
+
+    bind_game("abc123")
+    request_id_var.set("bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "calls": args.calls,
+            "output": args.output,
+            "sync": run_sync(args.output, tmp, args.calls),
+            "queue": run_queue(args.output, tmp, args.calls, queue_size=args.queue_size),
+            "throttled": run_queue(args.output, tmp, args.calls, extra=throttle(key="eat:abc123", rate=1),
+                                   queue_size=args.queue_size),
+            "disabled": run_disabled(args.calls),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
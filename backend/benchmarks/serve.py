@@ -0,0 +1,124 @@
+# Runs main.app under uvicorn for the load test, with a probe endpoint.
+#
+# GET /bench/probe reports event-loop lag (measured by a task that sleeps a
+# fixed interval and records how late it wakes up), OS thread count and RSS
+# of the server process. Pass ?reset=1 to start a new lag window.
+#
+# Run from the backend directory:  python -m benchmarks.serve --port 8765
+import argparse
+import asyncio
+import os
+import resource
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import uvicorn
+from fastapi import APIRouter
+
+from main import app
+
+LAG_INTERVAL = 0.01
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+            if len(self.samples) > 100000:
+                del self.samples[:50000]
+
+    def summary(self, reset: bool = False) -> dict:
+        samples = sorted(self.samples)
+        if reset:
+            self.samples = []
+        if not samples:
+            return {"samples": 0, "p50_seconds": None, "p99_seconds": None, "max_seconds": None}
+        return {
+            "samples": len(samples),
+            "p50_seconds": round(samples[len(samples) // 2], 6),
+            "p99_seconds": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 6),
+            "max_seconds": round(samples[-1], 6),
+        }
+
+
+def _proc_status(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes() -> int:
+    rss = _proc_status("VmRSS")
+    if rss is not None:
+        return rss * 1024
+    # Peak rather than current RSS, but the best we get without /proc
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def thread_count() -> int:
+    return _proc_status("Threads") or threading.active_count()
+
+
+lag_monitor = LoopLagMonitor()
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    lag_monitor.start()
+    try:
+        yield
+    finally:
+        await lag_monitor.stop()
+
+
+bench = APIRouter(lifespan=_lifespan)
+
+
+@bench.get("/bench/probe")
+async def probe(reset: bool = False):
+    return {
+        "pid": os.getpid(),
+        "loop_lag": lag_monitor.summary(reset),
+        "threads": thread_count(),
+        "rss_bytes": rss_bytes(),
+    }
+
+
+app.include_router(bench)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve main.app with a benchmark probe")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
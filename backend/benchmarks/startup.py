@@ -0,0 +1,141 @@
+# Import and startup budget of the backend.
+#
+# Imports main in fresh interpreters under `python -X importtime` and reports
+# the median total import time and the packages that cost the most. Unless
+# --import-only is given, it then starts the app under uvicorn against the
+# fake Kubernetes API and measures how long the process takes to answer
+# /api/health (live) and /api/ready (ready to receive traffic).
+#
+# Run from the backend directory:
+#   python -m benchmarks.startup [--runs 5 --import-budget 1000 --ready-budget 5]
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_k8s import kubeconfig
+from benchmarks.loadtest import BACKEND_DIR, free_port, wait_for
+
+
+# (module, self us, cumulative us) for every line of -X importtime output
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+
+def import_once(module: str) -> Tuple[float, Dict[str, float]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    modules = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative in modules if name == module)
+    # Self time summed per top-level package
+    packages: Dict[str, float] = {}
+    for name, own, _ in modules:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + own
+    return total / 1000, {package: own / 1000 for package, own in packages.items()}
+
+
+def measure_imports(module: str, runs: int, top: int) -> Dict:
+    totals = []
+    packages: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        total, per_package = import_once(module)
+        totals.append(total)
+        for package, ms in per_package.items():
+            packages.setdefault(package, []).append(ms)
+    medians = {package: statistics.median(samples) for package, samples in packages.items()}
+    heaviest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "heaviest_packages_ms": {package: round(ms, 1) for package, ms in heaviest},
+    }
+
+
+def measure_startup(timeout: float) -> Dict:
+    fake_port = free_port()
+    app_port = free_port()
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "kubeconfig")
+        with open(config_path, "w") as f:
+            f.write(kubeconfig(fake_port))
+        env = dict(os.environ)
+        env.update({
+            "KUBECONFIG": config_path,
+            "DOMAIN": f"127.0.0.1:{fake_port}",
+            "SNAKE_IMAGE": env.get("SNAKE_IMAGE", "bench"),
+            "WARM_POOL_SIZE": "0",
+            "PYTHONPATH": BACKEND_DIR,
+        })
+        env.pop("KUBERNETES_SERVICE_HOST", None)
+        try:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_k8s", "--port", str(fake_port)],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            asyncio.run(wait_for(f"http://127.0.0.1:{fake_port}/fake/stats", 15))
+
+            start = time.perf_counter()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+            async def timings():
+                await wait_for(f"http://127.0.0.1:{app_port}/api/health", timeout)
+                live = time.perf_counter() - start
+                await wait_for(f"http://127.0.0.1:{app_port}/api/ready", timeout)
+                return live, time.perf_counter() - start
+            live, ready = asyncio.run(timings())
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+    return {"live_seconds": round(live, 3), "ready_seconds": round(ready, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time and time to ready")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to list")
+    parser.add_argument("--import-only", action="store_true", help="skip starting the app")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--import-budget", type=float, help="fail if the median import takes longer (ms)")
+    parser.add_argument("--ready-budget", type=float, help="fail if /api/ready takes longer (seconds)")
+    args = parser.parse_args()
+
+    result = {"imports": measure_imports(args.module, args.runs, args.top)}
+    if not args.import_only:
+        result["startup"] = measure_startup(args.timeout)
+    print(json.dumps(result, indent=2))
+
+    over = []
+    if args.import_budget is not None and result["imports"]["median_ms"] > args.import_budget:
+        over.append(f"import {result['imports']['median_ms']}ms > {args.import_budget}ms")
+    if args.ready_budget is not None and "startup" in result and result["startup"]["ready_seconds"] > args.ready_budget:
+        over.append(f"ready {result['startup']['ready_seconds']}s > {args.ready_budget}s")
+    if over:
+        print(f"Over budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
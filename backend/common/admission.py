@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from common import metrics
+from common.logger import logger
+
+# Hash of admitted games -> replicas reserved for them, in the state store
+GAMES = "admission:games"
+
+REJECTIONS = metrics.Counter("podlands_admission_rejections_total", "Games turned away by admission control", ("budget",))
+QUEUE_SECONDS = metrics.Histogram("podlands_admission_wait_seconds", "Time /init waited for a game budget")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, budget: str, retry_after: float):
+        super().__init__(f"{budget} budget exhausted")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+# Level L such that giving every game min(requested, L) fits the budget
+# (max-min fair share). Games asking for less than L keep their full rate;
+# the rest are scaled down to the same level. None when nothing is capped.
+def fair_share(rates: List[float], budget: Optional[float]) -> Optional[float]:
+    if not budget or sum(rates) <= budget:
+        return None
+    remaining = budget
+    ordered = sorted(rates)
+    for index, rate in enumerate(ordered):
+        level = remaining / (len(ordered) - index)
+        if rate > level:
+            return level
+        remaining -= rate
+    return None
+
+
+# Global budgets for games and projected replicas.
+#
+# Every game reserves the worst case its HPA can scale to when it is created
+# and gives the reservation back once the teardown queue has deleted it, so
+# the budget holds no matter which path ends a game (kill, closed stream,
+# reaper). Reservations live in the state store and are checked under a
+# short store lease, so every worker and replica enforces the same budget.
+# When no budget is free, /init either waits in a bounded queue or is
+# rejected with a retry hint. Load is never rejected: target rates are capped
+# per game here, and the load coordinator scales them down to a fair share
+# when their total is over budget.
+class AdmissionController:
+    def __init__(self, store, owner: str, max_games: int = 0, max_replicas: int = 0,
+                 max_game_load_rate: float = 0, queue_timeout: float = 0, queue_size: int = 100, retry_after: float = 5):
+        self.store = store
+        self.owner = owner
+        self.max_games = max_games
+        self.max_replicas = max_replicas
+        self.max_game_load_rate = max_game_load_rate
+        self.queue_timeout = queue_timeout
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+
+        self.waiting = 0
+        self._released = asyncio.Event()
+        self._claims = itertools.count()
+
+    # Reserve room for a new game, waiting up to queue_timeout for it
+    async def admit(self, game_id: str, replicas: int):
+        deadline = time.monotonic() + self.queue_timeout
+        start = time.perf_counter()
+        budget = await self._reserve(game_id, replicas)
+        if budget is None:
+            return
+        if self.queue_timeout <= 0 or self.waiting >= self.queue_size:
+            self._reject(game_id, budget)
+
+        self.waiting += 1
+        try:
+            while budget is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject(game_id, budget)
+                # Releases on this worker wake us up; other workers' are polled
+                self._released.clear()
+                try:
+                    await asyncio.wait_for(self._released.wait(), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+                budget = await self._reserve(game_id, replicas)
+        finally:
+            self.waiting -= 1
+            QUEUE_SECONDS.observe(time.perf_counter() - start)
+
+    def _reject(self, game_id: str, budget: str):
+        REJECTIONS.inc(budget)
+        logger.warning(f"Rejecting game {game_id}: {budget} budget exhausted")
+        raise AdmissionRejected(budget, self.retry_after)
+
+    # Teardown queue callback, once the games' resources are deleted
+    async def release(self, game_ids: List[str]):
+        await self.store.hdel(GAMES, *game_ids)
+        self._released.set()
+
+    # Game ids currently holding a reservation
+    async def reserved(self) -> List[str]:
+        return list(await self.store.hgetall(GAMES))
+
+    # Per-game load cap, or None when there is none
+    def max_rate(self) -> Optional[float]:
+        return float(self.max_game_load_rate) if self.max_game_load_rate else None
+
+    # Requested load rate after the per-game cap
+    def clamp_rate(self, rate: float) -> float:
+        rate = max(0.0, rate)
+        if self.max_game_load_rate:
+            rate = min(rate, float(self.max_game_load_rate))
+        return rate
+
+    async def usage(self) -> Dict:
+        games = await self.store.hgetall(GAMES)
+        return {
+            "games": {"used": len(games), "limit": self.max_games or None},
+            "replicas": {"used": sum(int(replicas) for replicas in games.values()), "limit": self.max_replicas or None},
+            "queue": {"waiting": self.waiting, "limit": self.queue_size, "timeout_seconds": self.queue_timeout},
+        }
+
+    # Name of the exhausted budget, or None once the game has been reserved
+    async def _reserve(self, game_id: str, replicas: int) -> Optional[str]:
+        if not self.max_games and not self.max_replicas:
+            await self.store.hset(GAMES, game_id, replicas)
+            return None
+        claim = f"{self.owner}:{next(self._claims)}"
+        while not await self.store.acquire_lease("admission", claim, 5.0):
+            await asyncio.sleep(0.01)
+        try:
+            games = await self.store.hgetall(GAMES)
+            if self.max_games and len(games) >= self.max_games:
+                return "games"
+            if self.max_replicas and sum(int(value) for value in games.values()) + replicas > self.max_replicas:
+                return "replicas"
+            await self.store.hset(GAMES, game_id, replicas)
+            return None
+        finally:
+            await self.store.release_lease("admission", claim)
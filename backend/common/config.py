@@ -9,4 +9,37 @@ CORS_DOMAIN = os.getenv("CORS_DOMAIN", "http://localhost:5173")
 SNAKE_NAMESPACE = os.getenv("SNAKE_NAMESPACE", "snake")
 SNAKE_IMAGE = os.getenv("SNAKE_IMAGE", "")
 LOAD_INCREMENT = os.getenv("LOAD_INCREMENT", 100.0)
-PODS_DELETE_INTERVAL = os.getenv("PODS_DELETE_INTERVAL", 3)
\ No newline at end of file
+PODS_DELETE_INTERVAL = os.getenv("PODS_DELETE_INTERVAL", 3)
+METRICS_INTERVAL = os.getenv("METRICS_INTERVAL", 15)
+KUBE_POOL_SIZE = os.getenv("KUBE_POOL_SIZE", 40)
+KUBE_MAX_CONCURRENCY = os.getenv("KUBE_MAX_CONCURRENCY", 32)
+WARM_POOL_SIZE = os.getenv("WARM_POOL_SIZE", 0)
+LOAD_MAX_CONCURRENCY = os.getenv("LOAD_MAX_CONCURRENCY", 256)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LEASE_TTL = os.getenv("LEASE_TTL", 10)
+STREAM_BATCH_WINDOW = os.getenv("STREAM_BATCH_WINDOW", 0.05)
+STREAM_METRICS_INTERVAL = os.getenv("STREAM_METRICS_INTERVAL", 1)
+TEARDOWN_BATCH_SIZE = os.getenv("TEARDOWN_BATCH_SIZE", 20)
+TEARDOWN_MAX_ATTEMPTS = os.getenv("TEARDOWN_MAX_ATTEMPTS", 8)
+REAPER_INTERVAL = os.getenv("REAPER_INTERVAL", 60)
+REAPER_GRACE = os.getenv("REAPER_GRACE", 300)
+EAT_POLICY = os.getenv("EAT_POLICY", "oldest")
+EAT_GRACE_PERIOD = os.getenv("EAT_GRACE_PERIOD", "")
+MAX_GAMES = os.getenv("MAX_GAMES", 100)
+MAX_REPLICAS = os.getenv("MAX_REPLICAS", 1000)
+MAX_LOAD_RATE = os.getenv("MAX_LOAD_RATE", 10000)
+MAX_GAME_LOAD_RATE = os.getenv("MAX_GAME_LOAD_RATE", 1000)
+ADMISSION_QUEUE_TIMEOUT = os.getenv("ADMISSION_QUEUE_TIMEOUT", 0)
+ADMISSION_QUEUE_SIZE = os.getenv("ADMISSION_QUEUE_SIZE", 100)
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", 5)
+TEMPLATE_RELOAD_INTERVAL = os.getenv("TEMPLATE_RELOAD_INTERVAL", 5)
+POD_WATCH_TIMEOUT = os.getenv("POD_WATCH_TIMEOUT", 300)
+HISTORY_INTERVAL = os.getenv("HISTORY_INTERVAL", 5)
+HISTORY_SIZE = os.getenv("HISTORY_SIZE", 720)
+STREAM_BUFFER_SIZE = os.getenv("STREAM_BUFFER_SIZE", 256)
+STREAM_MAX_LAG = os.getenv("STREAM_MAX_LAG", 10)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_RATE_LIMIT = os.getenv("LOG_RATE_LIMIT", 50)
+LOG_QUEUE_SIZE = os.getenv("LOG_QUEUE_SIZE", 10000)
\ No newline at end of file
@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import random
+from typing import Callable, Dict, List, Optional, Set
+
+from common import kube, metrics
+from common.logger import logger
+
+# Which Running pod /eat deletes
+POLICIES = ("oldest", "newest", "random", "least-loaded")
+
+EVICTIONS = metrics.Counter("podlands_evictions_total", "Pods deleted by /eat, by outcome", ("result",))
+
+
+# Running pods that are not already on their way out
+def eligible(pods: List) -> List:
+    return [pod for pod in pods
+            if pod.status and pod.status.phase == "Running" and not pod.metadata.deletion_timestamp]
+
+
+# Pods in the order the policy would like to eat them
+def rank(pods: List, policy: str, usage: Optional[Callable[[str], Optional[float]]] = None) -> List:
+    if policy == "random":
+        pods = list(pods)
+        random.shuffle(pods)
+        return pods
+    if policy == "least-loaded" and usage is not None:
+        # Pods without a metrics sample go last
+        def load(pod):
+            value = usage(pod.metadata.name)
+            return (value is None, value or 0.0)
+        return sorted(pods, key=load)
+    created = sorted(pods, key=lambda pod: (pod.metadata.creation_timestamp is None, pod.metadata.creation_timestamp or 0))
+    return created[::-1] if policy == "newest" else created
+
+
+# Deletes one pod per /eat without making the request wait.
+#
+# The victim comes from the informer's cached pods of the game, never from a
+# LIST. Before deleting, the pod is claimed with an `evict:{pod}` lease in the
+# state store, so concurrent /eat calls (on any worker) pick different pods.
+# The DELETE itself runs as a background task; a failed delete releases the
+# claim so the pod can be picked again.
+class PodEvictor:
+    def __init__(self, namespace: str, store, owner: str, policy: str = "oldest",
+                 grace_period: Optional[int] = None, claim_ttl: float = 30.0):
+        if policy not in POLICIES:
+            logger.warning(f"Unknown eat policy {policy}, using oldest")
+            policy = "oldest"
+        self.namespace = namespace
+        self.store = store
+        self.owner = owner
+        self.policy = policy
+        self.grace_period = grace_period
+        self.claim_ttl = claim_ttl
+
+        self._deletes: Set[asyncio.Task] = set()
+        # Every claim gets its own lease owner; re-acquiring our own lease
+        # would otherwise succeed and let two calls eat the same pod
+        self._claims = itertools.count()
+
+    async def stop(self):
+        if self._deletes:
+            await asyncio.gather(*self._deletes, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {"policy": self.policy, "grace_period_seconds": self.grace_period, "in_flight": len(self._deletes)}
+
+    # Claim and start deleting a pod of the game; returns its name, or None
+    # if the game has no Running pod that isn't already being eaten
+    async def evict(self, pods: List, usage: Optional[Callable[[str], Optional[float]]] = None) -> Optional[str]:
+        for pod in rank(eligible(pods), self.policy, usage):
+            name = pod.metadata.name
+            claim = f"{self.owner}:{next(self._claims)}"
+            if not await self.store.acquire_lease(f"evict:{name}", claim, self.claim_ttl):
+                continue
+            delete = asyncio.create_task(self._delete(name, claim))
+            self._deletes.add(delete)
+            delete.add_done_callback(self._deletes.discard)
+            return name
+        EVICTIONS.inc("skipped")
+        return None
+
+    async def _delete(self, name: str, claim: str):
+        kwargs = {}
+        if self.grace_period is not None:
+            kwargs["grace_period_seconds"] = self.grace_period
+        try:
+            await kube.call(kube.core.delete_namespaced_pod, name, self.namespace, **kwargs)
+            EVICTIONS.inc("deleted")
+            logger.info(f"Deleted pod {name}")
+        except kube.ApiException as e:
+            if e.status == 404:
+                EVICTIONS.inc("gone")
+                return
+            EVICTIONS.inc("failed")
+            logger.error(f"Error deleting pod {name}: {e}")
+            await self.store.release_lease(f"evict:{name}", claim)
+        except Exception as e:
+            EVICTIONS.inc("failed")
+            logger.error(f"Error deleting pod {name}: {e}")
+            await self.store.release_lease(f"evict:{name}", claim)
@@ -0,0 +1,268 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from common import metrics
+from common.informer import PodInformer, pod_state
+from common.logger import detached_context, logger
+
+COALESCED = metrics.Counter("podlands_stream_coalesced_total", "Pod events merged into one already waiting for the same pod")
+METRICS_DROPPED = metrics.Counter("podlands_stream_metrics_dropped_total", "METRICS snapshots replaced before they were sent")
+RESYNCS = metrics.Counter("podlands_stream_resyncs_total", "Stream buffers that overflowed and were replaced by a SYNC snapshot")
+SLOW_DISCONNECTS = metrics.Counter("podlands_stream_slow_disconnects_total", "Streams closed for falling behind", ("reason",))
+
+# Reasons an outbox is closed for that count as a slow consumer
+SLOW = ("lagging", "timeout")
+
+
+# Bounded buffer of frames waiting to go out to one WebSocket.
+#
+# A MODIFIED event for a pod that still has an event waiting only updates
+# that event's status, and only the newest METRICS snapshot is kept (the
+# delta against what this client last got is worked out when it's sent).
+# If more than `capacity` pod events pile up anyway, they are thrown away and
+# the client gets one SYNC snapshot of the game's pods once it catches up.
+# An outbox that keeps overflowing for `max_lag` seconds is closed.
+class Outbox:
+    def __init__(self, snapshot: Callable[[], List], capacity: int = 256, max_lag: float = 10.0):
+        self.snapshot = snapshot
+        self.capacity = capacity
+        self.max_lag = max_lag
+        self.closed: Optional[str] = None
+
+        self._events: List[Dict] = []
+        # Pod -> its event still waiting in _events, for coalescing
+        self._waiting: Dict[str, Dict] = {}
+        self._metrics: Optional[Dict] = None
+        self._sent_metrics: Dict = {}
+        # Pods this client has been told about, to build a SYNC from
+        self._known: Set[str] = set()
+        self._resync = False
+        self._behind_since: Optional[float] = None
+        self._ready = asyncio.Event()
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    def put_event(self, event: Dict):
+        if self.closed:
+            return
+        if self._resync:
+            # A snapshot is going out anyway and will include this change
+            self._check_lag()
+            return
+        pod = event.get("pod")
+        if event["type"] == "MODIFIED" and pod in self._waiting:
+            self._waiting[pod]["status"] = event["status"]
+            COALESCED.inc()
+            return
+        if len(self._events) >= self.capacity:
+            self._overflow()
+            return
+        # Events are shared between outboxes, and ours may be coalesced into
+        event = dict(event)
+        self._events.append(event)
+        if event["type"] in ("ADDED", "MODIFIED"):
+            self._waiting[pod] = event
+        elif event["type"] == "DELETED":
+            self._waiting.pop(pod, None)
+        else:
+            self._waiting.clear()
+        self._ready.set()
+
+    def set_metrics(self, snapshot: Dict):
+        if self.closed:
+            return
+        if self._metrics is not None:
+            METRICS_DROPPED.inc()
+        self._metrics = snapshot
+        self._ready.set()
+
+    def close(self, reason: str):
+        if self.closed:
+            return
+        self.closed = reason
+        if reason in SLOW:
+            SLOW_DISCONNECTS.inc(reason)
+        self._ready.set()
+
+    async def wait(self):
+        await self._ready.wait()
+
+    # Frames to send now, in order: pod events (one frame, BATCH if several),
+    # then a METRICS delta
+    def drain(self) -> List[Dict]:
+        self._ready.clear()
+        events, self._events, self._waiting = self._events, [], {}
+        if self._resync:
+            self._resync = False
+            events = [self._sync()]
+        else:
+            self._behind_since = None
+        for event in events:
+            self._track(event)
+
+        frames = []
+        if len(events) == 1:
+            frames.append(events[0])
+        elif events:
+            frames.append({"type": "BATCH", "events": events})
+        if self._metrics is not None:
+            delta = {key: value for key, value in self._metrics.items() if self._sent_metrics.get(key) != value}
+            if delta:
+                frames.append({"type": "METRICS", **delta})
+            self._sent_metrics, self._metrics = self._metrics, None
+        return frames
+
+    def _overflow(self):
+        if self._behind_since is None:
+            self._behind_since = time.monotonic()
+        if self._check_lag():
+            return
+        RESYNCS.inc()
+        self._events, self._waiting, self._resync = [], {}, True
+        self._ready.set()
+
+    def _check_lag(self) -> bool:
+        if time.monotonic() - self._behind_since > self.max_lag:
+            self.close("lagging")
+            return True
+        return False
+
+    # Current pods of the game compared with what the client knows
+    def _sync(self) -> Dict:
+        current = {state["pod"]: state for state in (pod_state(pod) for pod in self.snapshot())}
+        return {
+            "type": "SYNC",
+            "added": [state for name, state in current.items() if name not in self._known],
+            "modified": [state for name, state in current.items() if name in self._known],
+            "deleted": [name for name in self._known if name not in current],
+        }
+
+    def _track(self, event: Dict):
+        if event["type"] == "ADDED":
+            self._known.add(event["pod"])
+        elif event["type"] == "DELETED":
+            self._known.discard(event["pod"])
+        elif event["type"] == "SYNC":
+            self._known.update(state["pod"] for state in event["added"])
+            self._known.difference_update(event["deleted"])
+
+
+# One upstream feed per game: a single informer subscription and a single
+# metrics sample per interval, copied into every viewer's outbox.
+class GameFeed:
+    def __init__(self, game_id: str, informer: PodInformer, sample: Callable[[str], Dict],
+                 metrics_interval: float, capacity: int, max_lag: float):
+        self.game_id = game_id
+        self.informer = informer
+        self.sample = sample
+        self.metrics_interval = metrics_interval
+        self.capacity = capacity
+        self.max_lag = max_lag
+        self.outboxes: Set[Outbox] = set()
+        self._metrics: Optional[Dict] = None
+
+        # Joiners get the current pods from the cache instead of a replay
+        self._queue = informer.subscribe(game_id, replay=False)
+        # Started by the first viewer, but runs on behalf of all of them
+        self._task = asyncio.create_task(self._run(), context=detached_context())
+
+    def join(self) -> Outbox:
+        outbox = Outbox(lambda: self.informer.pods(self.game_id), self.capacity, self.max_lag)
+        for pod in self.informer.pods(self.game_id):
+            outbox.put_event({"type": "ADDED", **pod_state(pod)})
+        if self._metrics is not None:
+            outbox.set_metrics(self._metrics)
+        self.outboxes.add(outbox)
+        return outbox
+
+    def stop(self):
+        self._task.cancel()
+        self.informer.unsubscribe(self.game_id, self._queue)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_metrics = loop.time()
+        next_event = asyncio.create_task(self._queue.get())
+        try:
+            while True:
+                await asyncio.wait({next_event}, timeout=max(0.0, next_metrics - loop.time()))
+                if next_event.done():
+                    events = [next_event.result()]
+                    while not self._queue.empty():
+                        events.append(self._queue.get_nowait())
+                    next_event = asyncio.create_task(self._queue.get())
+                    for outbox in list(self.outboxes):
+                        for event in events:
+                            outbox.put_event(event)
+
+                if loop.time() >= next_metrics:
+                    next_metrics = loop.time() + self.metrics_interval
+                    try:
+                        self._metrics = self.sample(self.game_id)
+                    except Exception as e:
+                        logger.error(f"Error sampling metrics for game {self.game_id}: {e}")
+                        continue
+                    for outbox in list(self.outboxes):
+                        outbox.set_metrics(self._metrics)
+        finally:
+            next_event.cancel()
+
+
+# Stream fan-out for every game on this worker.
+#
+# The first viewer of a game starts its feed and the last one to leave stops
+# it, so spectators cost an outbox each but no extra informer subscription
+# or metrics computation.
+class GameFeeds:
+    def __init__(self, informer: PodInformer, sample: Callable[[str], Dict], metrics_interval: float = 1.0,
+                 capacity: int = 256, max_lag: float = 10.0):
+        self.informer = informer
+        self.sample = sample
+        self.metrics_interval = metrics_interval
+        self.capacity = capacity
+        self.max_lag = max_lag
+        self._feeds: Dict[str, GameFeed] = {}
+
+    def join(self, game_id: str) -> Outbox:
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            feed = self._feeds[game_id] = GameFeed(game_id, self.informer, self.sample, self.metrics_interval,
+                                                   self.capacity, self.max_lag)
+        return feed.join()
+
+    def leave(self, game_id: str, outbox: Outbox):
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            return
+        feed.outboxes.discard(outbox)
+        if not feed.outboxes:
+            feed.stop()
+            del self._feeds[game_id]
+
+    # Close every viewer of a game, e.g. once it has been killed
+    def end(self, game_id: str):
+        feed = self._feeds.get(game_id)
+        if feed is not None:
+            for outbox in feed.outboxes:
+                outbox.close("ended")
+
+    def stop(self):
+        for feed in self._feeds.values():
+            for outbox in feed.outboxes:
+                outbox.close("shutdown")
+            feed.stop()
+        self._feeds.clear()
+
+    # Events waiting to be sent, per viewer
+    def queue_depths(self) -> List[int]:
+        return [outbox.pending() for feed in self._feeds.values() for outbox in feed.outboxes]
+
+    def stats(self) -> Dict:
+        return {
+            "feeds": len(self._feeds),
+            "viewers": sum(len(feed.outboxes) for feed in self._feeds.values()),
+            "buffer_size": self.capacity,
+            "max_lag_seconds": self.max_lag,
+        }
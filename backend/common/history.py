@@ -0,0 +1,166 @@
+import asyncio
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Optional
+
+from common.logger import logger
+
+# Values kept per sample, as named in METRICS frames
+FIELDS = ("cpu_percent", "memory_percent", "running_pods", "requests_per_sec")
+
+
+# Fixed-size ring of samples for one game.
+#
+# Timestamps and each field live in preallocated flat arrays, so a game costs
+# the same memory after a minute as after a day and appending never allocates.
+class MetricRing:
+    __slots__ = ("capacity", "count", "next", "timestamps", "values")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self.next = 0
+        self.timestamps = array("d", [0.0]) * capacity
+        self.values = tuple(array("d", [0.0]) * capacity for _ in FIELDS)
+
+    def append(self, timestamp: float, sample: Dict):
+        slot = self.next
+        self.timestamps[slot] = timestamp
+        for values, field in zip(self.values, FIELDS):
+            values[slot] = float(sample.get(field) or 0.0)
+        self.next = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    # Slots in chronological order
+    def slots(self) -> Iterable[int]:
+        first = (self.next - self.count) % self.capacity
+        return ((first + offset) % self.capacity for offset in range(self.count))
+
+    # min/max/avg of every field over `buckets` equal slices of the last
+    # `window` seconds; buckets without samples are left out
+    def downsample(self, window: float, buckets: int, now: float) -> Dict:
+        start = now - window
+        width = window / buckets
+        counts = [0] * buckets
+        lows = [[0.0] * buckets for _ in FIELDS]
+        highs = [[0.0] * buckets for _ in FIELDS]
+        sums = [[0.0] * buckets for _ in FIELDS]
+        for slot in self.slots():
+            timestamp = self.timestamps[slot]
+            if timestamp < start:
+                continue
+            bucket = min(buckets - 1, int((timestamp - start) / width))
+            first = counts[bucket] == 0
+            counts[bucket] += 1
+            for index, values in enumerate(self.values):
+                value = values[slot]
+                if first or value < lows[index][bucket]:
+                    lows[index][bucket] = value
+                if first or value > highs[index][bucket]:
+                    highs[index][bucket] = value
+                sums[index][bucket] += value
+
+        filled = [bucket for bucket in range(buckets) if counts[bucket]]
+        series = {
+            field: {
+                "min": [round(lows[index][bucket], 2) for bucket in filled],
+                "max": [round(highs[index][bucket], 2) for bucket in filled],
+                "avg": [round(sums[index][bucket] / counts[bucket], 2) for bucket in filled],
+            }
+            for index, field in enumerate(FIELDS)
+        }
+        return {
+            "bucket_seconds": round(width, 3),
+            "timestamps": [round(start + bucket * width, 3) for bucket in filled],
+            "samples": [counts[bucket] for bucket in filled],
+            "series": series,
+        }
+
+
+# Metric history of every game, fed by a single sampler task.
+#
+# Every `interval` seconds the sampler reads the same cached values the
+# METRICS frames are built from (no API calls) for each game on the cluster
+# and appends them to that game's ring, however many streams are open.
+# Killed games are forgotten right away and not picked up again while their
+# pods wind down; games that disappear by other means (killed on another
+# worker, reaped) are dropped once they have had no pods for `idle_ttl`.
+class MetricHistory:
+    def __init__(self, games: Callable[[], Iterable[str]], sample: Callable[[str], Dict],
+                 interval: float = 5.0, capacity: int = 720, idle_ttl: float = 300.0):
+        self.games = games
+        self.sample = sample
+        self.interval = interval
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+
+        self._rings: Dict[str, MetricRing] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._forgotten: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def forget(self, game_id: str):
+        self._rings.pop(game_id, None)
+        self._last_seen.pop(game_id, None)
+        self._forgotten[game_id] = time.monotonic()
+
+    def series(self, game_id: str, window: float, buckets: int) -> Optional[Dict]:
+        ring = self._rings.get(game_id)
+        if ring is None:
+            return None
+        window = max(self.interval, min(window, self.interval * self.capacity))
+        buckets = max(1, buckets)
+        return {"game_id": game_id, "interval_seconds": self.interval, "window_seconds": window,
+                **ring.downsample(window, buckets, time.time())}
+
+    def stats(self) -> Dict:
+        return {
+            "games": len(self._rings),
+            "interval_seconds": self.interval,
+            "capacity": self.capacity,
+            "bytes": sum(ring.timestamps.itemsize * ring.capacity * (len(FIELDS) + 1) for ring in self._rings.values()),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Error sampling metric history: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _tick(self):
+        now = time.time()
+        monotonic = time.monotonic()
+        for game_id in self.games():
+            if game_id in self._forgotten:
+                continue
+            ring = self._rings.get(game_id)
+            if ring is None:
+                ring = self._rings[game_id] = MetricRing(self.capacity)
+            ring.append(now, self.sample(game_id))
+            self._last_seen[game_id] = monotonic
+        self._expire(monotonic)
+
+    def _expire(self, monotonic: float):
+        for game_id, seen in list(self._last_seen.items()):
+            if monotonic - seen > self.idle_ttl:
+                del self._last_seen[game_id]
+                self._rings.pop(game_id, None)
+        # Long enough for a killed game's pods to be gone
+        for game_id, forgotten in list(self._forgotten.items()):
+            if monotonic - forgotten > self.idle_ttl:
+                del self._forgotten[game_id]
@@ -0,0 +1,275 @@
+import asyncio
+import functools
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from common import kube, metrics
+from common.logger import logger
+
+ACTIVE_WATCHES = metrics.Gauge("podlands_watches_active", "Open Kubernetes watch streams")
+WATCH_EVENTS = metrics.Counter("podlands_watch_events_total", "Pod watch events received", ("type",))
+WATCH_RESTARTS = metrics.Counter("podlands_watch_restarts_total", "Pod watches that ended and were reopened, by reason", ("reason",))
+RELISTS = metrics.Counter("podlands_watch_relists_total", "Full pod LISTs done by the informer, by reason", ("reason",))
+RECONNECT_SECONDS = metrics.Histogram("podlands_watch_reconnect_seconds", "Time from a pod watch ending until the next one is open")
+
+
+# Process-wide LIST+WATCH cache of pods in a namespace.
+#
+# A single background task keeps an in-memory copy of every pod matching the
+# label selector, indexed by its game_id label, and fans watch events out to
+# subscriber queues. Readers never talk to the API server themselves, so
+# API-server load stays flat no matter how many games or streams are open.
+#
+# Watches request bookmarks and always resume from the last resourceVersion
+# seen, so a watch the API server closes (timeouts, restarts, network errors)
+# is simply reopened without subscribers noticing. Only a 410 Gone forces a
+# fresh LIST; its differences from the cache go to subscribers as a single
+# compact SYNC event per game rather than a replay of every pod.
+class PodInformer:
+    def __init__(self, namespace: str, label_selector: str = "app=snake", watch_timeout: int = 300):
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.watch_timeout = watch_timeout
+
+        self._pods: Dict[str, object] = {}
+        self._by_game: Dict[str, Dict[str, object]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[Callable[[str, object], None]] = []
+        self._resource_version: Optional[str] = None
+        self._disconnected_at: Optional[float] = None
+        self._restarts = 0
+        self._relists = 0
+        self._synced = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started pod informer for namespace {self.namespace} ({self.label_selector})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def synced(self) -> bool:
+        return self._synced.is_set()
+
+    # Read API
+
+    def pods(self, game_id: str) -> List[object]:
+        return list(self._by_game.get(game_id, {}).values())
+
+    def game_ids(self) -> List[str]:
+        return list(self._by_game.keys())
+
+    # Subscriptions
+
+    # Called synchronously with (event type, pod) for every pod in the namespace
+    def add_listener(self, listener: Callable[[str, object], None]):
+        self._listeners.append(listener)
+
+    # With replay, current state is queued first as ADDED events so the
+    # subscriber sees the same sequence a fresh watch would have produced;
+    # without, only changes from now on
+    def subscribe(self, game_id: str, replay: bool = True) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        if replay:
+            for pod in self._by_game.get(game_id, {}).values():
+                queue.put_nowait(_pod_event("ADDED", pod))
+        self._subscribers.setdefault(game_id, set()).add(queue)
+        return queue
+
+    def stats(self) -> Dict:
+        return {
+            "pods": len(self._pods),
+            "resource_version": self._resource_version,
+            "watching": self._disconnected_at is None and self._synced.is_set(),
+            "restarts": self._restarts,
+            "relists": self._relists,
+        }
+
+    def unsubscribe(self, game_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(game_id)
+        if not subscribers:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[game_id]
+
+    # Internals
+
+    async def _run(self):
+        backoff = 1.0
+        reason = "initial"
+        while True:
+            try:
+                if self._resource_version is None:
+                    await self._relist(reason)
+                await self._watch()
+                # Closed by the server, e.g. timeout_seconds; resume where we left off
+                backoff = 1.0
+                reason = "closed"
+            except asyncio.CancelledError:
+                raise
+            except kube.ApiException as e:
+                if e.status == 410:
+                    # Our resourceVersion is too old, start over with a fresh LIST
+                    logger.info("Pod watch expired (410 Gone), re-listing")
+                    self._resource_version = None
+                    reason = "expired"
+                    self._restarted(reason)
+                    continue
+                logger.error(f"Pod informer API error: {e}")
+                reason = "error"
+                self._restarted(reason)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            except Exception as e:
+                logger.error(f"Pod informer error: {e}")
+                reason = "error"
+                self._restarted(reason)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            self._restarted(reason)
+
+    def _restarted(self, reason: str):
+        if self._disconnected_at is None:
+            self._disconnected_at = time.perf_counter()
+        self._restarts += 1
+        WATCH_RESTARTS.inc(reason)
+
+    # Watch (or LIST) response arrived, we're connected again
+    def _connected(self):
+        if self._disconnected_at is not None:
+            RECONNECT_SECONDS.observe(time.perf_counter() - self._disconnected_at)
+            self._disconnected_at = None
+
+    async def _relist(self, reason: str):
+        self._relists += 1
+        RELISTS.inc(reason)
+        pods = await kube.call(kube.core.list_namespaced_pod, self.namespace, label_selector=self.label_selector)
+        fresh = {pod.metadata.name: pod for pod in pods.items}
+        # Per game: what the LIST changed compared to our cache
+        changes: Dict[str, Dict[str, List]] = {}
+
+        def changed(kind: str, pod):
+            self._notify(kind, pod)
+            game_id = _game_id(pod)
+            if game_id in self._subscribers:
+                diff = changes.setdefault(game_id, {"added": [], "modified": [], "deleted": []})
+                key = kind.lower()
+                diff[key].append(pod.metadata.name if kind == "DELETED" else pod_state(pod))
+
+        for name, pod in list(self._pods.items()):
+            if name not in fresh:
+                self._remove(pod)
+                changed("DELETED", pod)
+        for name, pod in fresh.items():
+            old = self._pods.get(name)
+            self._store(pod)
+            if old is None:
+                changed("ADDED", pod)
+            elif old.metadata.resource_version != pod.metadata.resource_version:
+                changed("MODIFIED", pod)
+        for game_id, diff in changes.items():
+            event = {"type": "SYNC", **diff}
+            for queue in self._subscribers.get(game_id, ()):
+                queue.put_nowait(event)
+        self._resource_version = pods.metadata.resource_version
+        self._synced.set()
+
+    async def _watch(self):
+        # Wrapped so we know when the API server has answered the watch request
+        @functools.wraps(kube.core.list_namespaced_pod)
+        async def list_pods(*args, **kwargs):
+            response = await kube.core.list_namespaced_pod(*args, **kwargs)
+            self._connected()
+            return response
+
+        ACTIVE_WATCHES.inc()
+        try:
+            async with kube.watch.Watch() as w:
+                async for event in w.stream(
+                    list_pods,
+                    self.namespace,
+                    label_selector=self.label_selector,
+                    resource_version=self._resource_version,
+                    allow_watch_bookmarks=True,
+                    timeout_seconds=self.watch_timeout,
+                ):
+                    WATCH_EVENTS.inc(event["type"])
+                    if event["type"] == "BOOKMARK":
+                        # Nothing changed, but we can resume from here later
+                        self._resource_version = w.resource_version
+                        continue
+                    pod = event["object"]
+                    if event["type"] == "DELETED":
+                        self._remove(pod)
+                    else:
+                        self._store(pod)
+                    self._publish(event["type"], pod)
+                    self._resource_version = pod.metadata.resource_version
+        finally:
+            ACTIVE_WATCHES.dec()
+
+    def _store(self, pod):
+        name = pod.metadata.name
+        old = self._pods.get(name)
+        if old is not None and _game_id(old) != _game_id(pod):
+            self._remove(old)
+        self._pods[name] = pod
+        game_id = _game_id(pod)
+        if game_id:
+            self._by_game.setdefault(game_id, {})[name] = pod
+
+    def _remove(self, pod):
+        name = pod.metadata.name
+        old = self._pods.pop(name, None) or pod
+        game_id = _game_id(old)
+        game_pods = self._by_game.get(game_id)
+        if game_pods is not None:
+            game_pods.pop(name, None)
+            if not game_pods:
+                del self._by_game[game_id]
+
+    def _notify(self, event_type: str, pod):
+        for listener in self._listeners:
+            try:
+                listener(event_type, pod)
+            except Exception as e:
+                logger.error(f"Error in pod informer listener: {e}")
+
+    def _publish(self, event_type: str, pod):
+        self._notify(event_type, pod)
+        subscribers = self._subscribers.get(_game_id(pod))
+        if not subscribers:
+            return
+        event = _pod_event(event_type, pod)
+        for queue in subscribers:
+            queue.put_nowait(event)
+
+
+def _game_id(pod) -> Optional[str]:
+    labels = pod.metadata.labels or {}
+    return labels.get("game_id")
+
+
+def pod_state(pod) -> Dict:
+    return {
+        "pod": pod.metadata.name,
+        "status": pod.status.phase if pod.status else None
+    }
+
+
+def _pod_event(event_type: str, pod) -> Dict:
+    return {
+        "type": event_type,  # ADDED, MODIFIED, DELETED
+        **pod_state(pod)
+    }
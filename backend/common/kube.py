@@ -0,0 +1,125 @@
+import asyncio
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from common import metrics
+from common.config import KUBE_POOL_SIZE, KUBE_MAX_CONCURRENCY
+from common.logger import logger
+
+if TYPE_CHECKING:
+    from kubernetes_asyncio import client
+
+# Shared asyncio Kubernetes clients.
+#
+# Every API object below wraps the same ApiClient, so all calls go through a
+# single keep-alive aiohttp connection pool. They are populated by init() on
+# startup; import the module and use kube.core etc. rather than the names.
+#
+# kubernetes_asyncio (and the few hundred generated models it pulls in) is
+# only imported by init(), keeping it off the import path of the app. Other
+# modules reach it through this one: kube.ApiException, kube.watch.
+api_client: Optional["client.ApiClient"] = None
+apps: Optional["client.AppsV1Api"] = None
+autoscaling: Optional["client.AutoscalingV2Api"] = None
+core: Optional["client.CoreV1Api"] = None
+net: Optional["client.NetworkingV1Api"] = None
+custom: Optional["client.CustomObjectsApi"] = None
+
+# Caps in-flight request/response calls; long-running watches bypass it
+_limit = asyncio.Semaphore(int(KUBE_MAX_CONCURRENCY))
+
+REQUEST_SECONDS = metrics.Histogram(
+    "podlands_kube_request_seconds", "Kubernetes API call latency, including time queued for the limit",
+    ("verb", "resource"))
+REQUEST_ERRORS = metrics.Counter(
+    "podlands_kube_request_errors_total", "Failed Kubernetes API calls", ("verb", "resource", "code"))
+IN_FLIGHT = metrics.Gauge("podlands_kube_requests_in_flight", "Kubernetes API calls in progress")
+
+
+# Serialises init() so concurrent callers share one set of clients
+_init_lock = asyncio.Lock()
+
+
+def __getattr__(name: str):
+    if name == "ApiException":
+        from kubernetes_asyncio.client.rest import ApiException
+        return ApiException
+    if name == "watch":
+        from kubernetes_asyncio import watch
+        return watch
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def ready() -> bool:
+    return api_client is not None
+
+
+# Create the shared clients; later calls return straight away
+async def init():
+    async with _init_lock:
+        if api_client is None:
+            await _init()
+
+
+async def _init():
+    global api_client, apps, autoscaling, core, net, custom
+    from kubernetes_asyncio import client, config
+
+    configuration = client.Configuration()
+    # Load config (works locally with kubeconfig or in-cluster)
+    try:
+        logger.info("Loading in-cluster config")
+        config.load_incluster_config(client_configuration=configuration)
+        logger.info("Successfully loaded in-cluster config")
+    except Exception as e:
+        logger.warning(f"Failed to load in-cluster config: {e}")
+        logger.info("Loading kubeconfig")
+        await config.load_kube_config(client_configuration=configuration)
+        logger.info("Successfully loaded kubeconfig")
+
+    configuration.connection_pool_maxsize = int(KUBE_POOL_SIZE)
+    api_client = client.ApiClient(configuration)
+    apps = client.AppsV1Api(api_client)
+    autoscaling = client.AutoscalingV2Api(api_client)
+    core = client.CoreV1Api(api_client)
+    net = client.NetworkingV1Api(api_client)
+    custom = client.CustomObjectsApi(api_client)
+
+
+async def close():
+    global api_client
+    if api_client:
+        await api_client.close()
+        api_client = None
+
+
+# (verb, resource) of a generated API method, e.g. delete_namespaced_deployment
+@lru_cache(maxsize=None)
+def _describe(name: str) -> Tuple[str, str]:
+    verb, _, resource = name.partition("_")
+    if resource.startswith("collection_"):
+        verb, resource = "deletecollection", resource[len("collection_"):]
+    return verb, resource.replace("namespaced_", "", 1) or "unknown"
+
+
+# Run a single API call under the global concurrency limit
+async def call(fn, *args, **kwargs):
+    labels = _describe(getattr(fn, "__name__", "unknown"))
+    start = time.perf_counter()
+    IN_FLIGHT.inc()
+    try:
+        async with _limit:
+            return await fn(*args, **kwargs)
+    except Exception as e:
+        REQUEST_ERRORS.inc(*labels, _error_code(e))
+        raise
+    finally:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
+
+
+
+def _error_code(error: Exception) -> str:
+    from kubernetes_asyncio.client.rest import ApiException
+    return str(error.status) if isinstance(error, ApiException) else "error"
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import math
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Set, Tuple
+
+from common.admission import fair_share
+from common.logger import logger, throttle
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Upper bounds (seconds) of the per-game latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+
+# Achieved rate is averaged over this many seconds of completions
+RATE_WINDOW = 5
+
+
+class GameLoad:
+    def __init__(self, game_id: str, rate: float):
+        self.game_id = game_id
+        self.rate = rate
+        self.credit = 0.0
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.buckets: List[int] = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        # (second, completions) for the last RATE_WINDOW seconds
+        self.completions: Deque[Tuple[int, int]] = deque()
+
+    def record(self, latency: float, ok: bool):
+        if not ok:
+            self.errors += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.latency_sum += latency
+        second = int(time.monotonic())
+        if self.completions and self.completions[-1][0] == second:
+            self.completions[-1] = (second, self.completions[-1][1] + 1)
+        else:
+            self.completions.append((second, 1))
+        while self.completions and self.completions[0][0] < second - RATE_WINDOW:
+            self.completions.popleft()
+
+    def achieved_rate(self) -> float:
+        now = int(time.monotonic())
+        # Only count whole seconds, the current one is still filling up
+        done = sum(count for second, count in self.completions if now - RATE_WINDOW <= second < now)
+        return done / RATE_WINDOW
+
+    def latency_percentile(self, p: float) -> float:
+        total = sum(self.buckets)
+        if total == 0:
+            return 0.0
+        threshold = total * p / 100.0
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= threshold:
+                return bound if bound != float("inf") else LATENCY_BUCKETS[-2]
+        return LATENCY_BUCKETS[-2]
+
+
+# Shared open-loop load generator for every game.
+#
+# One scheduler task hands each game request "credit" at its target rate and
+# fires that many requests per tick through a single pooled keep-alive
+# session, independent of how long earlier requests take. Global concurrency
+# is capped; requests that would exceed the cap are counted as dropped rather
+# than queued, so an overloaded target cannot make the backend fall behind.
+class LoadEngine:
+    def __init__(self, url_template: str, max_concurrency: int = 256, timeout: float = 2.0, tick: float = 0.01):
+        self.url_template = url_template
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.tick = tick
+
+        self.games: Dict[str, GameLoad] = {}
+        self.in_flight = 0
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._requests: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for request in list(self._requests):
+            request.cancel()
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def set_rate(self, game_id: str, rate: float):
+        # The scheduler hands out credit in proportion to the rate
+        if not math.isfinite(rate) or rate < 0:
+            raise ValueError(f"Invalid load rate {rate} for game {game_id}")
+        game = self.games.get(game_id)
+        if game is None:
+            self.games[game_id] = GameLoad(game_id, rate)
+        else:
+            game.rate = rate
+        self.start()
+        self._wakeup.set()
+
+    def remove(self, game_id: str):
+        self.games.pop(game_id, None)
+
+    def stats(self, game_id: str) -> Optional[Dict]:
+        game = self.games.get(game_id)
+        if game is None:
+            return None
+        return {
+            "target_rate": game.rate,
+            "achieved_rate": game.achieved_rate(),
+            "sent": game.sent,
+            "errors": game.errors,
+            "dropped": game.dropped,
+            "latency_p50": game.latency_percentile(50),
+            "latency_p99": game.latency_percentile(99),
+            "latency_buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS], game.buckets)),
+        }
+
+    async def _run(self):
+        last = time.monotonic()
+        while True:
+            if not any(game.rate > 0 for game in self.games.values()):
+                # Nothing to do, sleep until a game asks for load
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                last = time.monotonic()
+                continue
+
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            elapsed = now - last
+            last = now
+
+            for game in list(self.games.values()):
+                if game.rate <= 0:
+                    game.credit = 0.0
+                    continue
+                # Never bank more than a second's worth of requests
+                game.credit = min(game.credit + game.rate * elapsed, max(game.rate, 1.0))
+                while game.credit >= 1.0:
+                    if self.in_flight >= self.max_concurrency:
+                        # Drop the rest of this tick's requests in one go
+                        dropped = int(game.credit)
+                        game.dropped += dropped
+                        game.credit -= dropped
+                        break
+                    game.credit -= 1.0
+                    self.in_flight += 1
+                    game.in_flight += 1
+                    game.sent += 1
+                    request = asyncio.create_task(self._send(game))
+                    self._requests.add(request)
+                    request.add_done_callback(self._requests.discard)
+
+    async def _send(self, game: GameLoad):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        # Use the ingress URL (public domain) to trigger autoscaling
+        url = self.url_template.format(game_id=game.game_id)
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with self._session.get(url) as response:
+                await response.read()
+                ok = response.status < 500
+        except Exception as e:
+            logger.debug(f"Error sending request to {url}: {e}", extra=throttle(key=f"load-error:{game.game_id}", rate=1))
+        finally:
+            self.in_flight -= 1
+            game.in_flight -= 1
+            game.record(time.perf_counter() - start, ok)
+
+
+# Keys in the shared state store
+RATES = "load:rates"
+STATS = "load:stats"
+
+
+# Shares load generation between workers and replicas.
+#
+# Target rates live in the state store. Every worker periodically walks them
+# and runs load only for the games whose lease it holds, so each game is
+# driven by exactly one engine no matter which worker received /load. Owners
+# publish achieved stats back to the store for workers serving the stream.
+# When the requested rates add up to more than max_total_rate, every game is
+# driven at its max-min fair share instead of the rate it asked for.
+class LoadCoordinator:
+    def __init__(self, engine: LoadEngine, store, owner: str, lease_ttl: float = 10.0, interval: float = 1.0,
+                 max_total_rate: float = 0):
+        self.engine = engine
+        self.store = store
+        self.owner = owner
+        self.lease_ttl = lease_ttl
+        self.interval = interval
+        self.max_total_rate = max_total_rate
+
+        self._shared: Dict[str, Dict] = {}
+        # Requested rates as of the last sync, plus our own updates since
+        self._rates: Dict[str, float] = {}
+        self._level: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for game_id in list(self.engine.games):
+            await self.store.release_lease(f"load:{game_id}", self.owner)
+            self.engine.remove(game_id)
+
+    # Target rate and achieved stats, from our engine or the owning worker
+    def stats(self, game_id: str) -> Optional[Dict]:
+        return self.engine.stats(game_id) or self._shared.get(game_id)
+
+    # Rate a game is actually driven at, given what it asked for
+    def allowed_rate(self, rate: float) -> float:
+        return rate if self._level is None else min(rate, self._level)
+
+    # Total requested rate across all games, as of the last sync
+    def budget(self) -> Dict:
+        return {
+            "requested": round(sum(self._rates.values()), 2),
+            "limit": self.max_total_rate or None,
+            "fair_share": round(self._level, 2) if self._level is not None else None,
+        }
+
+    async def set_rate(self, game_id: str, rate: float):
+        await self.store.hset(RATES, game_id, rate)
+        self._update_rates({**self._rates, game_id: rate})
+        await self._claim(game_id, rate)
+
+    # Increase the target rate, but never past `maximum`
+    async def add_rate(self, game_id: str, amount: float, maximum: Optional[float] = None) -> float:
+        rate = await self.store.hincrbyfloat(RATES, game_id, amount, maximum)
+        self._update_rates({**self._rates, game_id: rate})
+        await self._claim(game_id, rate)
+        return rate
+
+    async def remove(self, game_id: str):
+        await self.store.hdel(RATES, game_id)
+        await self.store.hdel(STATS, game_id)
+        if game_id in self.engine.games:
+            self.engine.remove(game_id)
+            await self.store.release_lease(f"load:{game_id}", self.owner)
+        self._shared.pop(game_id, None)
+        self._rates.pop(game_id, None)
+
+    def _update_rates(self, rates: Dict[str, float]):
+        self._rates = rates
+        self._level = fair_share(list(rates.values()), self.max_total_rate)
+
+    async def _claim(self, game_id: str, rate: float):
+        if await self.store.acquire_lease(f"load:{game_id}", self.owner, self.lease_ttl):
+            self.engine.set_rate(game_id, self.allowed_rate(rate))
+
+    async def _run(self):
+        while True:
+            try:
+                await self._sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error syncing load ownership: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _sync(self):
+        rates = {}
+        for game_id, rate in (await self.store.hgetall(RATES)).items():
+            rate = float(rate)
+            if not math.isfinite(rate) or rate < 0:
+                # Not accepted by /load; ignored rather than driven
+                logger.warning(f"Ignoring invalid load rate {rate} for game {game_id}",
+                               extra=throttle(key=f"load-rate:{game_id}", rate=0.1))
+                continue
+            rates[game_id] = rate
+        self._update_rates(rates)
+
+        # Stop games that were killed or whose lease moved elsewhere
+        for game_id in list(self.engine.games):
+            if game_id not in rates:
+                self.engine.remove(game_id)
+                await self.store.release_lease(f"load:{game_id}", self.owner)
+
+        # One round trip renews every lease and one publishes every stat,
+        # however many games there are
+        game_ids = list(rates)
+        held = await self.store.acquire_leases([f"load:{game_id}" for game_id in game_ids], self.owner, self.lease_ttl)
+        published = {}
+        for game_id, owned in zip(game_ids, held):
+            rate = rates[game_id]
+            if owned:
+                self.engine.set_rate(game_id, self.allowed_rate(rate))
+                stats = self.engine.stats(game_id)
+                published[game_id] = json.dumps({
+                    **{key: stats[key] for key in ("target_rate", "achieved_rate", "sent", "errors", "dropped")},
+                    "requested_rate": rate,
+                })
+            elif game_id in self.engine.games:
+                self.engine.remove(game_id)
+        await self.store.hset_many(STATS, published)
+
+        shared = await self.store.hgetall(STATS)
+        self._shared = {game_id: json.loads(value) for game_id, value in shared.items()}
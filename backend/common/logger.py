@@ -1,13 +1,200 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import time
+import uuid
+from contextvars import Context, ContextVar, copy_context
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-    ]
-)
+from common.config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_RATE_LIMIT
 
-logger = logging.getLogger(__name__)
\ No newline at end of file
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Attached to every record logged while they are set. Each request and
+# WebSocket runs in its own context, and tasks it creates inherit it.
+game_id_var: ContextVar[Optional[str]] = ContextVar("game_id", default=None)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def bind_game(game_id: str):
+    game_id_var.set(game_id)
+
+
+# Context for a background task started while handling a request, so its
+# logs aren't tagged with a request that may be long gone
+def detached_context() -> Context:
+    context = copy_context()
+    context.run(request_id_var.set, None)
+    return context
+
+
+# `extra` for repetitive messages, e.g.
+#   logger.info(..., extra=throttle(key=f"eat:{game_id}", rate=1))
+# rate: records per second let through for the key (default: LOG_RATE_LIMIT
+# per call site); sample: fraction of records kept before rate limiting
+def throttle(key: Optional[str] = None, rate: Optional[float] = None, sample: Optional[float] = None) -> Dict:
+    extra = {}
+    if key is not None:
+        extra["log_key"] = key
+    if rate is not None:
+        extra["log_rate"] = rate
+    if sample is not None:
+        extra["log_sample"] = sample
+    return extra
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.game_id = game_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+
+# Sampling and per-key token buckets, applied in the calling thread so a
+# suppressed record costs a dict lookup rather than a queue round trip. The
+# next record let through for a key carries how many were suppressed before it.
+class ThrottleFilter(logging.Filter):
+    def __init__(self, rate: float = 0.0, max_keys: int = 10000):
+        super().__init__()
+        self.rate = rate
+        self.max_keys = max_keys
+        self.sampled_out = 0
+        self.suppressed = 0
+        # key -> [tokens, last refill, suppressed since last record]
+        self._buckets: Dict[object, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = getattr(record, "log_sample", None)
+        if sample is not None and random.random() >= sample:
+            self.sampled_out += 1
+            return False
+        rate = getattr(record, "log_rate", self.rate)
+        if not rate:
+            return True
+        key = getattr(record, "log_key", None) or (record.pathname, record.lineno)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.clear()
+            bucket = self._buckets[key] = [max(rate, 1.0), now, 0]
+        tokens = min(max(rate, 1.0), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] = tokens - 1.0
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+# Hands records to the listener thread without ever blocking the caller: the
+# message and traceback are rendered here, and a full queue drops the record.
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # Unlike the stdlib version this doesn't copy the record first: any other
+    # handler would still render the same message and traceback from it
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    FIELDS = ("game_id", "request_id", "suppressed")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+# Pure ASGI middleware (no per-request task like BaseHTTPMiddleware) that
+# binds an X-Request-ID, taken from the client or generated, to everything
+# logged while handling the request or WebSocket, and echoes it back.
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+def stats() -> Dict:
+    return {
+        "queued": _queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "suppressed": _throttle.suppressed,
+        "sampled_out": _throttle.sampled_out,
+    }
+
+
+_exception_formatter = logging.Formatter()
+
+# Records are formatted and written to stdout by a single listener thread
+_queue: queue.Queue = queue.Queue(maxsize=int(LOG_QUEUE_SIZE))
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+_listener = logging.handlers.QueueListener(_queue, _stream_handler)
+
+_throttle = ThrottleFilter(rate=float(LOG_RATE_LIMIT))
+_queue_handler = NonBlockingQueueHandler(_queue)
+_queue_handler.addFilter(_throttle)
+_queue_handler.addFilter(ContextFilter())
+
+logging.basicConfig(level=LOG_LEVEL.upper(), handlers=[_queue_handler])
+_listener.start()
+atexit.register(_listener.stop)
+
+logger = logging.getLogger(__name__)
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
+
+from common.logger import logger
+
+# Stand-in rendered into the templates once; swapped for the real id per game
+GAME_ID_PLACEHOLDER = "__game_id__"
+
+MANIFESTS = ("deployment", "service", "autoscaling", "ingress")
+
+# Scaling profiles, next to the templates
+PROFILES_FILE = "snake/profiles.yaml"
+
+DEFAULT_PROFILE = "default"
+
+
+class UnknownProfile(Exception):
+    pass
+
+
+# Per-game manifests, compiled once per scaling profile.
+#
+# The Jinja templates under kubernetes/snake/ are rendered and parsed a single
+# time for every profile in profiles.yaml, with everything but the game id
+# filled in, and frozen so no caller can modify the shared copy. Each game
+# then only needs a cheap copy of its profile's skeletons with the placeholder
+# replaced. A background task polls the template files and recompiles when one
+# changes; a broken edit is logged and the last good compile stays in use.
+class GameManifests:
+    def __init__(self, template_dir: str, namespace: str, image: str, domain: str, reload_interval: float = 5.0):
+        self.template_dir = template_dir
+        self.namespace = namespace
+        self.image = image
+        self.domain = domain
+        self.reload_interval = reload_interval
+        self._compiled: Mapping[str, Mapping[str, Mapping]] = MappingProxyType({})
+        self._mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.reload_interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def load(self):
+        # Only needed to compile, not on the import path of the app
+        import yaml
+        from jinja2 import Environment, FileSystemLoader
+
+        mtime = self._latest_mtime()
+        env = Environment(loader=FileSystemLoader(self.template_dir), trim_blocks=True, lstrip_blocks=True)
+        with open(os.path.join(self.template_dir, PROFILES_FILE)) as f:
+            profiles = yaml.safe_load(f) or {}
+        if DEFAULT_PROFILE not in profiles:
+            raise ValueError(f"{PROFILES_FILE} has no {DEFAULT_PROFILE} profile")
+
+        compiled = {}
+        for name, profile in profiles.items():
+            profile = {**profile, "name": name}
+            compiled[name] = _freeze({
+                manifest: yaml.safe_load(env.get_template(f"snake/{manifest}.yaml").render(
+                    game_id=GAME_ID_PLACEHOLDER,
+                    image=self.image,
+                    namespace=self.namespace,
+                    domain=self.domain,
+                    profile=profile
+                ))
+                for manifest in MANIFESTS
+            })
+        # Swap in one go, renders in flight keep using the old compile
+        self._compiled = MappingProxyType(compiled)
+        self._mtime = mtime
+        logger.info(f"Compiled game manifests for profiles: {', '.join(compiled)}")
+
+    def loaded(self) -> bool:
+        return bool(self._compiled)
+
+    def profiles(self) -> List[str]:
+        if not self._compiled:
+            self.load()
+        return list(self._compiled)
+
+    # HPA bounds of a profile, e.g. for admission control
+    def replicas(self, profile: str = DEFAULT_PROFILE) -> Dict[str, int]:
+        spec = self._skeletons(profile)["autoscaling"]["spec"]
+        return {"min": spec["minReplicas"], "max": spec["maxReplicas"]}
+
+    def render(self, game_id: str, profile: str = DEFAULT_PROFILE) -> Dict[str, Dict]:
+        return {name: _fill(skeleton, game_id) for name, skeleton in self._skeletons(profile).items()}
+
+    def _skeletons(self, profile: str) -> Mapping[str, Mapping]:
+        if not self._compiled:
+            self.load()
+        skeletons = self._compiled.get(profile)
+        if skeletons is None:
+            raise UnknownProfile(f"Unknown scaling profile {profile}")
+        return skeletons
+
+    def _latest_mtime(self) -> float:
+        paths = [os.path.join(self.template_dir, "snake", f"{name}.yaml") for name in MANIFESTS]
+        paths.append(os.path.join(self.template_dir, PROFILES_FILE))
+        return max(os.stat(path).st_mtime for path in paths)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if self._latest_mtime() != self._mtime:
+                    logger.info("Game templates changed, recompiling")
+                    self.load()
+            except Exception as e:
+                logger.error(f"Error reloading game templates, keeping the previous ones: {e}")
+                # Don't retry the same broken files every interval
+                try:
+                    self._mtime = self._latest_mtime()
+                except OSError:
+                    pass
+
+
+# Read-only copy of parsed YAML: mappings become MappingProxyType, lists tuples
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Fresh, mutable copy of a frozen skeleton with the game id filled in
+def _fill(value, game_id: str):
+    if isinstance(value, Mapping):
+        return {key: _fill(item, game_id) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_fill(item, game_id) for item in value]
+    if isinstance(value, str) and GAME_ID_PLACEHOLDER in value:
+        return value.replace(GAME_ID_PLACEHOLDER, game_id)
+    return value
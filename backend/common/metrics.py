@@ -0,0 +1,180 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from common.logger import logger
+
+# Default upper bounds (seconds) for latency histograms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# Every metric created in the process, in creation order
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+# Counter or gauge: one number per label set, either updated directly or
+# computed at scrape time by a callback returning a number (no labels) or
+# {labels: number}
+class _Scalar(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Union[float, Dict[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        # Unlabelled metrics are exported as 0 before their first update
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        values = self._values
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception as e:
+                logger.error(f"Error collecting metric {self.name}: {e}")
+                return []
+            values = result if isinstance(result, dict) else {(): result}
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in list(values.items())]
+
+
+# Monotonic count, e.g. requests or errors, or a callback reading a count
+# kept elsewhere
+class Counter(_Scalar):
+    kind = "counter"
+
+
+# Value that goes up and down
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+# Distribution of observations in fixed cumulative buckets
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) if buckets[-1] == float("inf") else tuple(buckets) + (float("inf"),)
+        # labels -> [per-bucket counts..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        if not self.labelnames:
+            self._values[()] = [0] * len(self.buckets) + [0.0]
+
+    def observe(self, value: float, *labels: str):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * len(self.buckets) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    # with histogram.time("label"): ...
+    def time(self, *labels: str) -> _Timer:
+        return _Timer(self, labels)
+
+    # Observations across the given label tuples (every series if none)
+    def count(self, *label_sets: Tuple[str, ...]) -> int:
+        return sum(self._merged(label_sets))
+
+    # Estimated q-quantile (0..1) across the given label tuples, interpolated
+    # within its bucket the way Prometheus' histogram_quantile() does
+    def quantile(self, q: float, *label_sets: Tuple[str, ...]) -> float:
+        counts = self._merged(label_sets)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if self.buckets[index] == float("inf"):
+                    return self.buckets[index - 1] if index else 0.0
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-2] if len(self.buckets) > 1 else 0.0
+
+    def _merged(self, label_sets: Sequence[Tuple[str, ...]]) -> List[int]:
+        merged = [0] * len(self.buckets)
+        for labels, counts in list(self._values.items()):
+            if label_sets and labels not in label_sets:
+                continue
+            for index, count in enumerate(counts[:-1]):
+                merged[index] += count
+        return merged
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, counts in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# Prometheus text exposition format (version 0.0.4) of every metric
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
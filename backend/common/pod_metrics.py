@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from common import kube
+from common.logger import logger
+
+
+# Namespace-wide collector for pods.metrics.k8s.io.
+#
+# metrics-server only refreshes its samples every ~15s, so instead of asking
+# for every pod of every game on every tick we LIST the whole namespace once
+# per interval and keep the result grouped by game_id. Per-game lookups are
+# then a dictionary access against the latest snapshot.
+class PodMetricsCollector:
+    def __init__(self, namespace: str, interval: float = 15.0, label_selector: str = "app=snake"):
+        self.namespace = namespace
+        self.interval = interval
+        self.label_selector = label_selector
+
+        self.available = True
+        self._snapshot: Dict[str, Dict[str, List[Dict]]] = {}
+        self._last_fetch: Optional[float] = None
+        self._last_fetch_duration = 0.0
+        self._fetches = 0
+        self._fetch_errors = 0
+        self._listeners: List[Callable[[Dict[str, Dict[str, List[Dict]]]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started pod metrics collector for namespace {self.namespace} every {self.interval}s")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # Called with the full {game_id: {pod: [container usage]}} snapshot after each fetch
+    def add_listener(self, listener: Callable[[Dict[str, Dict[str, List[Dict]]]], None]):
+        self._listeners.append(listener)
+
+    def stats(self) -> Dict:
+        staleness = time.time() - self._last_fetch if self._last_fetch else None
+        return {
+            "available": self.available,
+            "interval_seconds": self.interval,
+            "fetches": self._fetches,
+            "fetch_errors": self._fetch_errors,
+            "last_fetch_seconds": round(self._last_fetch_duration, 4),
+            "staleness_seconds": round(staleness, 2) if staleness is not None else None,
+            "games": len(self._snapshot),
+            "pods": sum(len(pods) for pods in self._snapshot.values()),
+        }
+
+    async def _run(self):
+        while True:
+            await self._fetch()
+            await asyncio.sleep(self.interval)
+
+    async def _fetch(self):
+        start = time.perf_counter()
+        try:
+            result = await kube.call(
+                kube.custom.list_namespaced_custom_object,
+                group="metrics.k8s.io",
+                version="v1beta1",
+                namespace=self.namespace,
+                plural="pods",
+                label_selector=self.label_selector
+            )
+        except kube.ApiException as e:
+            self._fetch_errors += 1
+            if e.status == 404:
+                if self.available:
+                    logger.warning("metrics.k8s.io is not available, falling back to estimates")
+                self.available = False
+            logger.debug(f"Could not list pod metrics: {e}")
+            return
+        except Exception as e:
+            self._fetch_errors += 1
+            logger.debug(f"Could not list pod metrics: {e}")
+            return
+
+        snapshot: Dict[str, Dict[str, List[Dict]]] = {}
+        for item in result.get("items", []):
+            metadata = item.get("metadata", {})
+            game_id = (metadata.get("labels") or {}).get("game_id")
+            if not game_id:
+                continue
+            snapshot.setdefault(game_id, {})[metadata.get("name")] = [
+                container.get("usage", {}) for container in item.get("containers", [])
+            ]
+
+        self._snapshot = snapshot
+        self._last_fetch = time.time()
+        self._last_fetch_duration = time.perf_counter() - start
+        self._fetches += 1
+        self.available = True
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Error in pod metrics listener: {e}")
@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+
+# Multipliers for the Kubernetes resource.Quantity suffixes
+_SUFFIXES = {
+    "": 1.0,
+    # binarySI
+    "Ki": 2.0 ** 10,
+    "Mi": 2.0 ** 20,
+    "Gi": 2.0 ** 30,
+    "Ti": 2.0 ** 40,
+    "Pi": 2.0 ** 50,
+    "Ei": 2.0 ** 60,
+    # decimalSI
+    "n": 1e-9,
+    "u": 1e-6,
+    "m": 1e-3,
+    "k": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+}
+
+# <signedNumber> followed by a binarySI/decimalSI suffix or a decimal exponent.
+# "1E" is exa, "1E3" is an exponent: the anchor forces the regex to backtrack.
+_QUANTITY = re.compile(
+    r"^([+-]?(?:\d+\.?\d*|\.\d+))"
+    r"(?:(Ki|Mi|Gi|Ti|Pi|Ei|n|u|m|k|M|G|T|P|E)|[eE]([+-]?\d+))?$"
+)
+
+
+# Parse a Kubernetes quantity ("100m", "24Mi", "1.5G", "2e3", ...) into a float
+# in base units (cores for CPU, bytes for memory). Memoised, since pods of a
+# game all report the same handful of values.
+@lru_cache(maxsize=4096)
+def parse_quantity(quantity) -> float:
+    if isinstance(quantity, (int, float)):
+        return float(quantity)
+    match = _QUANTITY.match(str(quantity).strip())
+    if not match:
+        raise ValueError(f"Invalid quantity: {quantity!r}")
+    number, suffix, exponent = match.groups()
+    if exponent is not None:
+        return float(number) * 10.0 ** int(exponent)
+    return float(number) * _SUFFIXES[suffix or ""]
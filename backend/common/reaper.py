@@ -0,0 +1,152 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from common import kube
+from common.admission import AdmissionController
+from common.logger import logger
+from common.teardown import TeardownQueue
+
+# (API, list method) for every resource a game is made of
+_LISTS = (
+    ("apps", "list_namespaced_deployment"),
+    ("core", "list_namespaced_service"),
+    ("autoscaling", "list_namespaced_horizontal_pod_autoscaler"),
+    ("net", "list_namespaced_ingress"),
+)
+
+
+# Periodic garbage collection of abandoned games.
+#
+# Whoever keeps a game alive holds a `game:{game_id}` lease in the state
+# store (open streams and the warm pool). /init takes `grace:{game_id}` for
+# the grace period instead, so the stream can take `game:` from any worker
+# as soon as it connects. Load leases don't count: the load coordinator takes
+# them for any game with a target rate, alive or not. Any app=snake resources
+# older than the grace period whose game holds neither `game:` nor `grace:`
+# are handed to the teardown queue, which deletes them in batches. Only the worker holding
+# the `reaper` lease scans, so replicas don't duplicate LISTs.
+#
+# The same scan gives back admission reservations of games that have no
+# resources at all, e.g. because their worker died between admitting them
+# and creating them. A reservation is only released once it has been seen
+# without resources for the grace period, so games still being created
+# keep theirs.
+class GameReaper:
+    def __init__(self, namespace: str, teardown: TeardownQueue, store, owner: str,
+                 admission: Optional[AdmissionController] = None, interval: float = 60.0, grace: float = 300.0):
+        self.namespace = namespace
+        self.teardown = teardown
+        self.store = store
+        self.owner = owner
+        self.admission = admission
+        self.interval = interval
+        self.grace = grace
+
+        self._reaped = 0
+        self._released = 0
+        # Reserved game -> when it was first seen without resources
+        self._unbacked: Dict[str, float] = {}
+        self._last_scan: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started game reaper every {self.interval}s (grace {self.grace}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.store.release_lease("reaper", self.owner)
+
+    def stats(self) -> Dict:
+        return {"interval_seconds": self.interval, "reaped": self._reaped, "reservations_released": self._released,
+                "last_scan": self._last_scan}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self.store.acquire_lease("reaper", self.owner, self.interval * 2):
+                    await self.scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reaping games: {e}")
+
+    async def scan(self) -> int:
+        created = await self._games()
+        now = datetime.now(timezone.utc)
+        abandoned = []
+        for game_id, timestamp in created.items():
+            if self.teardown.pending(game_id):
+                continue
+            if timestamp and (now - timestamp).total_seconds() < self.grace:
+                continue
+            if await self.store.lease_owner(f"game:{game_id}") or await self.store.lease_owner(f"grace:{game_id}"):
+                continue
+            abandoned.append(game_id)
+
+        for game_id in abandoned:
+            self.teardown.enqueue(game_id)
+        self._reaped += len(abandoned)
+        released = await self._reconcile(created)
+        self._last_scan = {"games": len(created), "abandoned": len(abandoned), "released": released,
+                           "at": now.isoformat()}
+        if abandoned:
+            logger.info(f"Reaping {len(abandoned)} abandoned game(s) of {len(created)}")
+        return len(abandoned)
+
+    # Release reservations of games that have had no resources for the grace period
+    async def _reconcile(self, created: Dict[str, Optional[datetime]]) -> int:
+        if self.admission is None:
+            return 0
+        monotonic = time.monotonic()
+        unbacked = {}
+        for game_id in await self.admission.reserved():
+            if game_id in created or self.teardown.pending(game_id):
+                continue
+            unbacked[game_id] = self._unbacked.get(game_id, monotonic)
+        self._unbacked = unbacked
+
+        expired = [game_id for game_id, since in unbacked.items() if monotonic - since >= self.grace]
+        if expired:
+            logger.info(f"Releasing {len(expired)} reservation(s) of games without resources: {', '.join(expired)}")
+            await self.admission.release(expired)
+            for game_id in expired:
+                del self._unbacked[game_id]
+            self._released += len(expired)
+        return len(expired)
+
+    # Oldest creation time of any resource of each game, by game_id
+    async def _games(self) -> Dict[str, Optional[datetime]]:
+        created: Dict[str, Optional[datetime]] = {}
+
+        def add(metadata):
+            game_id = (metadata.labels or {}).get("game_id")
+            if not game_id:
+                return
+            timestamp = metadata.creation_timestamp
+            if game_id not in created or (timestamp and (created[game_id] is None or timestamp < created[game_id])):
+                created[game_id] = timestamp
+
+        for api, method in _LISTS:
+            token = None
+            while True:
+                kwargs = {"label_selector": "app=snake", "limit": 500}
+                if token:
+                    kwargs["_continue"] = token
+                result = await kube.call(getattr(getattr(kube, api), method), self.namespace, **kwargs)
+                for item in result.items:
+                    add(item.metadata)
+                token = result.metadata._continue if result.metadata else None
+                if not token:
+                    break
+        return created
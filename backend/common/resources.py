@@ -0,0 +1,171 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from common.logger import logger
+from common.quantity import parse_quantity
+
+# Share of the limit assumed for a running pod that has no metrics sample yet
+ESTIMATED_USAGE = 0.5
+
+
+# Resource limits and usage for the pods of one game.
+#
+# Each pod owns a slot in a handful of flat arrays. Pod events and metrics
+# snapshots only touch their own slot; totals are summed in a single pass
+# over the arrays and cached until something changes.
+class GameResources:
+    __slots__ = ("slots", "free", "running", "has_usage", "cpu_limit", "memory_limit",
+                 "cpu_usage", "memory_usage", "_totals")
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.running = array("b")
+        self.has_usage = array("b")
+        self.cpu_limit = array("d")
+        self.memory_limit = array("d")
+        self.cpu_usage = array("d")
+        self.memory_usage = array("d")
+        self._totals: Optional[Tuple[int, float, float, float, float]] = None
+
+    def _slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is not None:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.running)
+            for values in (self.running, self.has_usage, self.cpu_limit, self.memory_limit,
+                           self.cpu_usage, self.memory_usage):
+                values.append(0)
+        self.slots[name] = slot
+        return slot
+
+    def set_pod(self, name: str, running: bool, cpu_limit: float, memory_limit: float):
+        slot = self._slot(name)
+        self.running[slot] = 1 if running else 0
+        self.cpu_limit[slot] = cpu_limit
+        self.memory_limit[slot] = memory_limit
+        self._totals = None
+
+    def remove_pod(self, name: str):
+        slot = self.slots.pop(name, None)
+        if slot is None:
+            return
+        self.running[slot] = 0
+        self.has_usage[slot] = 0
+        self.cpu_limit[slot] = self.memory_limit[slot] = 0.0
+        self.cpu_usage[slot] = self.memory_usage[slot] = 0.0
+        self.free.append(slot)
+        self._totals = None
+
+    def set_usage(self, name: str, cpu: Optional[float], memory: Optional[float]):
+        slot = self.slots.get(name)
+        if slot is None:
+            return
+        if cpu is None:
+            self.has_usage[slot] = 0
+            self.cpu_usage[slot] = self.memory_usage[slot] = 0.0
+        else:
+            self.has_usage[slot] = 1
+            self.cpu_usage[slot] = cpu
+            self.memory_usage[slot] = memory
+        self._totals = None
+
+    # (running pods, cpu usage, memory usage, cpu limit, memory limit)
+    def totals(self) -> Tuple[int, float, float, float, float]:
+        if self._totals is not None:
+            return self._totals
+        running = 0
+        cpu_usage = memory_usage = cpu_limit = memory_limit = 0.0
+        for slot in range(len(self.running)):
+            if not self.running[slot]:
+                continue
+            running += 1
+            cpu_limit += self.cpu_limit[slot]
+            memory_limit += self.memory_limit[slot]
+            if self.has_usage[slot]:
+                cpu_usage += self.cpu_usage[slot]
+                memory_usage += self.memory_usage[slot]
+            else:
+                # No sample for this pod (yet), estimate from its own limits
+                cpu_usage += self.cpu_limit[slot] * ESTIMATED_USAGE
+                memory_usage += self.memory_limit[slot] * ESTIMATED_USAGE
+        self._totals = (running, cpu_usage, memory_usage, cpu_limit, memory_limit)
+        return self._totals
+
+
+# Per-game resource aggregation fed by the pod informer and metrics collector
+class ResourceIndex:
+    def __init__(self):
+        self.games: Dict[str, GameResources] = {}
+        self._usage: Dict[str, Dict[str, List[Dict]]] = {}
+
+    def totals(self, game_id: str) -> Tuple[int, float, float, float, float]:
+        game = self.games.get(game_id)
+        if game is None:
+            return (0, 0.0, 0.0, 0.0, 0.0)
+        return game.totals()
+
+    # CPU cores used by one pod, or None without a metrics sample
+    def pod_cpu_usage(self, game_id: str, name: str) -> Optional[float]:
+        game = self.games.get(game_id)
+        slot = game.slots.get(name) if game is not None else None
+        if slot is None or not game.has_usage[slot]:
+            return None
+        return game.cpu_usage[slot]
+
+    # Pod informer listener
+    def on_pod_event(self, event_type: str, pod):
+        game_id = (pod.metadata.labels or {}).get("game_id")
+        if not game_id:
+            return
+        name = pod.metadata.name
+        if event_type == "DELETED":
+            game = self.games.get(game_id)
+            if game is not None:
+                game.remove_pod(name)
+                if not game.slots:
+                    del self.games[game_id]
+            return
+
+        cpu_limit = memory_limit = 0.0
+        for container in pod.spec.containers or []:
+            limits = (container.resources.limits if container.resources else None) or {}
+            try:
+                if limits.get("cpu"):
+                    cpu_limit += parse_quantity(limits["cpu"])
+                if limits.get("memory"):
+                    memory_limit += parse_quantity(limits["memory"])
+            except ValueError as e:
+                logger.debug(f"Could not parse limits for pod {name}: {e}")
+
+        game = self.games.setdefault(game_id, GameResources())
+        game.set_pod(name, pod.status.phase == "Running" if pod.status else False, cpu_limit, memory_limit)
+        self._apply_usage(game_id, game, name)
+
+    # Metrics collector listener, called with the whole namespace snapshot
+    def on_metrics(self, usage: Dict[str, Dict[str, List[Dict]]]):
+        self._usage = usage
+        for game_id, game in self.games.items():
+            for name in game.slots:
+                self._apply_usage(game_id, game, name)
+
+    def _apply_usage(self, game_id: str, game: GameResources, name: str):
+        containers = self._usage.get(game_id, {}).get(name)
+        if containers is None:
+            game.set_usage(name, None, None)
+            return
+        cpu = memory = 0.0
+        try:
+            for usage in containers:
+                if "cpu" in usage:
+                    cpu += parse_quantity(usage["cpu"])
+                if "memory" in usage:
+                    memory += parse_quantity(usage["memory"])
+        except ValueError as e:
+            logger.debug(f"Could not parse metrics for pod {name}: {e}")
+            game.set_usage(name, None, None)
+            return
+        game.set_usage(name, cpu, memory)
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+from common.config import STATE_BACKEND, REDIS_URL
+from common.logger import logger
+
+# Identifies this worker process when taking leases
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+# Game state shared by every worker and replica of the backend.
+#
+# MemoryStore keeps everything in-process and is the default for a single
+# uvicorn worker. RedisStore talks to any Redis-compatible server so several
+# workers/replicas see the same counters, rates and leases. Both implement
+# the same small async interface: atomic counters, hashes and leases.
+class StateStore:
+    async def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def hset(self, name: str, field: str, value: str):
+        raise NotImplementedError
+
+    # Set several fields of a hash at once
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        raise NotImplementedError
+
+    # Atomic increment, optionally capped at `maximum` before it is written
+    async def hincrbyfloat(self, name: str, field: str, amount: float, maximum: Optional[float] = None) -> float:
+        raise NotImplementedError
+
+    async def hget(self, name: str, field: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def hdel(self, name: str, *fields: str):
+        raise NotImplementedError
+
+    # Take or renew a lease; True if `owner` holds it afterwards
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    # acquire_lease for several leases in one go; whether each is held afterwards
+    async def acquire_leases(self, names: List[str], owner: str, ttl: float) -> List[bool]:
+        raise NotImplementedError
+
+    # Drop a lease, but only if `owner` still holds it
+    async def release_lease(self, name: str, owner: str):
+        raise NotImplementedError
+
+    async def lease_owner(self, name: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStore(StateStore):
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._prune_at = 1024
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = int(self._values.get(key, 0)) + amount
+        self._values[key] = str(value)
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._values.get(key)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._values.pop(key, None)
+            self._hashes.pop(key, None)
+
+    async def hset(self, name: str, field: str, value: str):
+        self._hashes.setdefault(name, {})[field] = str(value)
+
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        self._hashes.setdefault(name, {}).update({field: str(value) for field, value in mapping.items()})
+
+    async def hincrbyfloat(self, name: str, field: str, amount: float, maximum: Optional[float] = None) -> float:
+        fields = self._hashes.setdefault(name, {})
+        value = float(fields.get(field, 0.0)) + amount
+        if maximum is not None:
+            value = min(value, maximum)
+        fields[field] = str(value)
+        return value
+
+    async def hget(self, name: str, field: str) -> Optional[str]:
+        return self._hashes.get(name, {}).get(field)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._hashes.get(name, {}))
+
+    async def hdel(self, name: str, *fields: str):
+        values = self._hashes.get(name, {})
+        for field in fields:
+            values.pop(field, None)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.monotonic()
+        current = self._leases.get(name)
+        if current and current[0] != owner and current[1] > now:
+            return False
+        self._leases[name] = (owner, now + ttl)
+        if len(self._leases) > self._prune_at:
+            # Short-lived leases (e.g. per pod) would otherwise pile up
+            self._leases = {key: lease for key, lease in self._leases.items() if lease[1] > now}
+            self._prune_at = max(1024, len(self._leases) * 2)
+        return True
+
+    async def acquire_leases(self, names: List[str], owner: str, ttl: float) -> List[bool]:
+        return [await self.acquire_lease(name, owner, ttl) for name in names]
+
+    async def release_lease(self, name: str, owner: str):
+        current = self._leases.get(name)
+        if current and current[0] == owner:
+            del self._leases[name]
+
+    async def lease_owner(self, name: str) -> Optional[str]:
+        current = self._leases.get(name)
+        if current and current[1] > time.monotonic():
+            return current[0]
+        return None
+
+
+# Take the lease if free, or extend it if we already own it
+_ACQUIRE_LEASE = """
+local current = redis.call('GET', KEYS[1])
+if current == false or current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# _ACQUIRE_LEASE for every key, returning 1/0 per key
+_ACQUIRE_LEASES = """
+local held = {}
+for i, key in ipairs(KEYS) do
+    local current = redis.call('GET', key)
+    if current == false or current == ARGV[1] then
+        redis.call('SET', key, ARGV[1], 'PX', ARGV[2])
+        held[i] = 1
+    else
+        held[i] = 0
+    end
+end
+return held
+"""
+
+_HINCRBYFLOAT_CAPPED = """
+local value = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') + tonumber(ARGV[2])
+if value > tonumber(ARGV[3]) then
+    value = tonumber(ARGV[3])
+end
+redis.call('HSET', KEYS[1], ARGV[1], tostring(value))
+return tostring(value)
+"""
+
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisStore(StateStore):
+    def __init__(self, url: str, prefix: str = "podlands:"):
+        # Only needed when the shared backend is selected
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._redis.incrby(self._key(key), amount)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self._key(key))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._redis.delete(*(self._key(key) for key in keys))
+
+    async def hset(self, name: str, field: str, value: str):
+        await self._redis.hset(self._key(name), field, str(value))
+
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        if mapping:
+            await self._redis.hset(self._key(name), mapping={field: str(value) for field, value in mapping.items()})
+
+    async def hincrbyfloat(self, name: str, field: str, amount: float, maximum: Optional[float] = None) -> float:
+        if maximum is None:
+            return float(await self._redis.hincrbyfloat(self._key(name), field, amount))
+        return float(await self._redis.eval(_HINCRBYFLOAT_CAPPED, 1, self._key(name), field, amount, maximum))
+
+    async def hget(self, name: str, field: str) -> Optional[str]:
+        return await self._redis.hget(self._key(name), field)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return await self._redis.hgetall(self._key(name))
+
+    async def hdel(self, name: str, *fields: str):
+        if fields:
+            await self._redis.hdel(self._key(name), *fields)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        # Plain EVAL: the scripts are tiny and this avoids SCRIPT LOAD round
+        # trips on stand-ins that don't cache scripts
+        result = await self._redis.eval(_ACQUIRE_LEASE, 1, self._key(f"lease:{name}"), owner, int(ttl * 1000))
+        return bool(result)
+
+    async def acquire_leases(self, names: List[str], owner: str, ttl: float) -> List[bool]:
+        if not names:
+            return []
+        keys = [self._key(f"lease:{name}") for name in names]
+        result = await self._redis.eval(_ACQUIRE_LEASES, len(keys), *keys, owner, int(ttl * 1000))
+        return [bool(held) for held in result]
+
+    async def release_lease(self, name: str, owner: str):
+        await self._redis.eval(_RELEASE_LEASE, 1, self._key(f"lease:{name}"), owner)
+
+    async def lease_owner(self, name: str) -> Optional[str]:
+        return await self._redis.get(self._key(f"lease:{name}"))
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+# Keeps leases alive for as long as something in this process holds them.
+#
+# hold()/release() are reference counted, so several holders (e.g. streams
+# of the same game) share one lease. A background task renews every held
+# lease well before it expires; if the process dies, they lapse on their own.
+class LeaseKeeper:
+    def __init__(self, store: StateStore, owner: str, ttl: float = 10.0):
+        self.store = store
+        self.owner = owner
+        self.ttl = ttl
+
+        self._held: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for name in list(self._held):
+            await self.store.release_lease(name, self.owner)
+        self._held.clear()
+
+    async def hold(self, name: str):
+        self._held[name] = self._held.get(name, 0) + 1
+        if not await self.store.acquire_lease(name, self.owner, self.ttl):
+            # Held by another worker, e.g. for another stream of the same
+            # game; renewals take it over once that one lapses
+            logger.warning(f"Lease {name} is held by another worker, will take it over when it expires")
+
+    async def release(self, name: str):
+        count = self._held.get(name, 0) - 1
+        if count > 0:
+            self._held[name] = count
+            return
+        self._held.pop(name, None)
+        await self.store.release_lease(name, self.owner)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            # Every held lease is renewed in a single round trip
+            names = list(self._held)
+            try:
+                held = await self.store.acquire_leases(names, self.owner, self.ttl)
+            except Exception as e:
+                logger.error(f"Error renewing {len(names)} lease(s): {e}")
+                continue
+            lost = [name for name, owned in zip(names, held) if not owned]
+            if lost:
+                logger.warning(f"Leases held by another worker: {', '.join(lost)}")
+
+
+def create_store() -> StateStore:
+    if STATE_BACKEND == "redis":
+        logger.info("Using Redis state store")
+        return RedisStore(REDIS_URL)
+    if STATE_BACKEND != "memory":
+        logger.warning(f"Unknown STATE_BACKEND {STATE_BACKEND}, using in-process state")
+    return MemoryStore()
@@ -0,0 +1,173 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from common import kube
+from common.logger import logger
+
+# (API, collection delete method) for every resource a game is made of
+_COLLECTIONS = (
+    ("apps", "delete_collection_namespaced_deployment"),
+    ("core", "delete_collection_namespaced_service"),
+    ("autoscaling", "delete_collection_namespaced_horizontal_pod_autoscaler"),
+    ("net", "delete_collection_namespaced_ingress"),
+)
+
+
+# Valid Kubernetes label value, which every game_id must be to be selected
+GAME_ID_PATTERN = r"^[A-Za-z0-9]([-A-Za-z0-9_.]{0,61}[A-Za-z0-9])?$"
+
+
+# Label selector matching every resource of the given games
+def game_selector(game_ids: List[str]) -> str:
+    if len(game_ids) == 1:
+        return f"app=snake,game_id={game_ids[0]}"
+    return f"app=snake,game_id in ({','.join(sorted(game_ids))})"
+
+
+# Background teardown of game resources.
+#
+# Games are queued rather than deleted inline, so a closing stream or /kill
+# never waits on the API server. The worker drains up to `batch_size` games at
+# a time and removes them with one deletecollection per resource type, using
+# a set-based game_id selector and background propagation so the garbage
+# collector cleans up ReplicaSets and pods. deletecollection is idempotent,
+# so a batch that partly failed is simply retried with backoff. A batch the
+# API server rejects as invalid (400/422) is split in halves until the game that
+# broke the selector is on its own, so it can't hold the others back.
+class TeardownQueue:
+    def __init__(self, namespace: str, batch_size: int = 20, max_attempts: int = 8, max_backoff: float = 60.0):
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._listeners: List[Callable[[List[str]], Awaitable[None]]] = []
+        self._pending: Set[str] = set()
+        self._attempts: Dict[str, int] = {}
+        self._retries: Set[asyncio.Task] = set()
+        self._completed = 0
+        self._failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    # Give queued teardowns up to `timeout` seconds to finish, then stop
+    async def stop(self, timeout: float = 10.0):
+        if self._task and self._pending:
+            try:
+                await asyncio.wait_for(self._drained(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Stopping with {len(self._pending)} game teardowns still pending")
+        for retry in list(self._retries):
+            retry.cancel()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # Awaited with each batch of game ids once their resources are deleted
+    def add_listener(self, listener: Callable[[List[str]], Awaitable[None]]):
+        self._listeners.append(listener)
+
+    def enqueue(self, game_id: str):
+        if game_id in self._pending:
+            return
+        self._pending.add(game_id)
+        self._queue.put_nowait(game_id)
+
+    def pending(self, game_id: str) -> bool:
+        return game_id in self._pending
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "retrying": len(self._retries),
+            "completed": self._completed,
+            "failed": self._failed,
+        }
+
+    async def _drained(self):
+        while self._pending:
+            await asyncio.sleep(0.05)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            done = await self._teardown(batch)
+            if not done:
+                continue
+            for game_id in done:
+                self._pending.discard(game_id)
+                self._attempts.pop(game_id, None)
+                self._completed += 1
+            logger.info(f"Tore down {len(done)} game(s): {', '.join(done)}")
+            for listener in self._listeners:
+                try:
+                    await listener(done)
+                except Exception as e:
+                    logger.error(f"Error in teardown listener: {e}")
+
+    # Games of the batch whose resources are gone; the rest are retried or given up
+    async def _teardown(self, batch: List[str]) -> List[str]:
+        try:
+            await self._delete(batch)
+            return batch
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not _rejected(e):
+                logger.error(f"Error tearing down games {batch}: {e}")
+                for game_id in batch:
+                    self._retry(game_id)
+                return []
+            if len(batch) == 1:
+                # Retrying the same selector would only be rejected again
+                logger.error(f"Giving up tearing down game {batch[0]}, rejected by the API server: {e}")
+                self._give_up(batch[0])
+                return []
+        middle = len(batch) // 2
+        return await self._teardown(batch[:middle]) + await self._teardown(batch[middle:])
+
+    async def _delete(self, game_ids: List[str]):
+        selector = game_selector(game_ids)
+        results = await asyncio.gather(*(
+            kube.call(getattr(getattr(kube, api), method), self.namespace,
+                      label_selector=selector, propagation_policy="Background")
+            for api, method in _COLLECTIONS
+        ), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    def _retry(self, game_id: str):
+        attempts = self._attempts.get(game_id, 0) + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Giving up tearing down game {game_id} after {attempts} attempts")
+            self._give_up(game_id)
+            return
+        self._attempts[game_id] = attempts
+        retry = asyncio.create_task(self._requeue(game_id, min(2 ** attempts, self.max_backoff)))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, game_id: str, delay: float):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(game_id)
+
+    def _give_up(self, game_id: str):
+        self._pending.discard(game_id)
+        self._attempts.pop(game_id, None)
+        self._failed += 1
+
+
+# The request itself is invalid, e.g. a selector with a bad label value
+def _rejected(error: Exception) -> bool:
+    return isinstance(error, kube.ApiException) and error.status in (400, 422)
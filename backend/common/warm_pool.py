@@ -0,0 +1,71 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from common.logger import logger
+
+
+# Pool of idle, already-created games.
+#
+# /init hands out a warm game immediately when one is available and the pool
+# refills itself in the background, so players only pay the provisioning
+# latency when the pool runs dry.
+class WarmPool:
+    def __init__(self, create: Callable[[], Awaitable[str]], size: int = 0):
+        self.create = create
+        self.size = size
+
+        self._ready: Deque[str] = deque()
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.size <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started warm game pool with {self.size} games")
+
+    async def stop(self) -> List[str]:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Hand back the idle games so the caller can tear them down
+        games = list(self._ready)
+        self._ready.clear()
+        return games
+
+    def take(self) -> Optional[str]:
+        game_id = self._ready.popleft() if self._ready else None
+        self._wakeup.set()
+        return game_id
+
+    def stats(self):
+        return {"size": self.size, "ready": len(self._ready), "pending": self._pending}
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            missing = self.size - len(self._ready) - self._pending
+            if missing > 0:
+                self._pending += missing
+                results = await asyncio.gather(*(self.create() for _ in range(missing)), return_exceptions=True)
+                self._pending -= missing
+                failed = False
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Error pre-creating warm game: {result}")
+                        failed = True
+                    else:
+                        self._ready.append(result)
+                if failed:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 1.0
+            self._wakeup.clear()
+            if len(self._ready) + self._pending >= self.size:
+                await self._wakeup.wait()
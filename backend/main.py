@@ -1,17 +1,30 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from kubernetes import client, config, watch
-import random
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
-import threading
-import sys
+from fastapi.responses import PlainTextResponse
 
+from common import kube, metrics
+from common import logger as logs
 from common.config import CORS_DOMAIN
-from common.logger import logger
+from common.logger import RequestIdMiddleware, logger
 
-app = FastAPI(title="Chaos Arena API")
+
+# Set up the shared asyncio Kubernetes clients before any router starts, and
+# close them after every router has stopped (router lifespans run nested)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await kube.init()
+    except Exception as e:
+        logger.error(f"Failed to load kubeconfig: {e}")
+        raise
+    try:
+        yield
+    finally:
+        await kube.close()
+
+
+app = FastAPI(title="Chaos Arena API", lifespan=lifespan)
 
 # Log startup
 logger.info("Starting Chaos Arena API")
@@ -23,30 +36,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
-# Load config (works locally with kubeconfig or in-cluster)
-try:
-    logger.info("Loading in-cluster config")
-    config.load_incluster_config()
-    logger.info("Successfully loaded in-cluster config")
-except Exception as e:
-    logger.warning(f"Failed to load in-cluster config: {e}")
-    try:
-        logger.info("Loading kubeconfig")
-        config.load_kube_config()
-        logger.info("Successfully loaded kubeconfig")
-    except Exception as e:
-        logger.error(f"Failed to load kubeconfig: {e}")
-        raise HTTPException(status_code=500, detail="Failed to load kubeconfig")
+# Tags every log line of a request or WebSocket with its X-Request-ID
+app.add_middleware(RequestIdMiddleware)
 
-v1 = client.CoreV1Api()
-NAMESPACE = "arena"
+# Logging pipeline health: records dropped on a full queue, or held back by
+# rate limits and sampling
+metrics.Counter("podlands_log_records_dropped_total", "Log records dropped because the log queue was full",
+                callback=lambda: logs.stats()["dropped"])
+metrics.Counter("podlands_log_records_suppressed_total", "Log records held back by per-key rate limits",
+                callback=lambda: logs.stats()["suppressed"])
+metrics.Gauge("podlands_log_queue_depth", "Log records waiting for the writer thread",
+              callback=lambda: logs.stats()["queued"])
 
+
+# Liveness: the process is up and serving requests
 @app.get("/api/health")
 def health_check():
     return {"status": "healthy"}
 
+
+# Readiness: clients are set up and the caches games depend on are filled
+@app.get("/api/ready")
+def readiness_check(response: Response):
+    checks = {"kubernetes": kube.ready(), **snake_readiness()}
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "starting", "checks": checks}
+
+
+# Prometheus scrape endpoint. Async so the gauge callbacks run on the event
+# loop, not a threadpool thread, while they walk the live game state
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include the snake router
-from routers.snake import router as snake_router
+from routers.snake import readiness as snake_readiness, router as snake_router
 app.include_router(snake_router, prefix="/api/snake")
\ No newline at end of file
@@ -1,162 +1,218 @@
-from fastapi import APIRouter, HTTPException
-from kubernetes import client, watch
-import random
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, HTTPException, Path, Query
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
-import threading
-import logging
-from logging.handlers import RotatingFileHandler
-import sys
-import yaml
-from jinja2 import Environment, FileSystemLoader
 import uuid
 from fastapi.websockets import WebSocket
 from fastapi.websockets import WebSocketDisconnect
 from fastapi.websockets import WebSocketState
-from common.config import SNAKE_NAMESPACE, SNAKE_IMAGE, DOMAIN, LOAD_INCREMENT, PODS_DELETE_INTERVAL
-from common.logger import logger
-from typing import Dict, Optional
-from datetime import datetime, timedelta
-import requests
+from common import kube, metrics
+from common.admission import AdmissionController, AdmissionRejected
+from common.config import (SNAKE_NAMESPACE, SNAKE_IMAGE, DOMAIN, LOAD_INCREMENT, PODS_DELETE_INTERVAL,
+                           METRICS_INTERVAL, WARM_POOL_SIZE, LOAD_MAX_CONCURRENCY, LEASE_TTL, STREAM_BATCH_WINDOW,
+                           STREAM_METRICS_INTERVAL, TEARDOWN_BATCH_SIZE, TEARDOWN_MAX_ATTEMPTS, REAPER_INTERVAL,
+                           REAPER_GRACE, EAT_POLICY, EAT_GRACE_PERIOD, MAX_GAMES, MAX_REPLICAS, MAX_LOAD_RATE,
+                           MAX_GAME_LOAD_RATE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_QUEUE_SIZE, ADMISSION_RETRY_AFTER,
+                           TEMPLATE_RELOAD_INTERVAL, POD_WATCH_TIMEOUT, HISTORY_INTERVAL, HISTORY_SIZE,
+                           STREAM_BUFFER_SIZE, STREAM_MAX_LAG)
+from common.eviction import PodEvictor
+from common.fanout import SLOW, GameFeeds
+from common.history import MetricHistory
+from common.informer import PodInformer
+from common.load_engine import LoadCoordinator, LoadEngine
+from common.logger import bind_game, logger, throttle
+from common.manifests import DEFAULT_PROFILE, GameManifests, UnknownProfile
+from common.pod_metrics import PodMetricsCollector
+from common.reaper import GameReaper
+from common.resources import ResourceIndex
+from common.state import WORKER_ID, LeaseKeeper, create_store
+from common.teardown import GAME_ID_PATTERN, TeardownQueue
+from common.warm_pool import WarmPool
+from typing import Annotated, Dict, List, Optional
+import math
 import time
 
-router = APIRouter()
-env = Environment(loader=FileSystemLoader('./kubernetes'), trim_blocks=True, lstrip_blocks=True)
 
-api = client.AppsV1Api()
-autoscaling = client.AutoscalingV2Api()
-core = client.CoreV1Api()
-net = client.NetworkingV1Api()
+# Components are started once the app's lifespan has set up the Kubernetes
+# clients, and stopped before those are closed
+@asynccontextmanager
+async def _lifespan(app):
+    await _start_components()
+    try:
+        yield
+    finally:
+        await _stop_components()
 
-# Try to initialize metrics API (may not be available in all clusters)
-try:
-    metrics_api = client.CustomObjectsApi()
-    METRICS_AVAILABLE = True
-except Exception as e:
-    logger.warning(f"Metrics API not available: {e}")
-    METRICS_AVAILABLE = False
 
-# Store request rate per game and load generators
-request_rates: Dict[str, Dict[str, any]] = {}
-load_generators: Dict[str, threading.Event] = {}
-load_threads: Dict[str, threading.Thread] = {}
+router = APIRouter(lifespan=_lifespan)
 
+# game_id path parameters end up in label selectors, so anything that isn't a
+# valid label value is turned away with a 422
+GameId = Annotated[str, Path(pattern=GAME_ID_PATTERN)]
 
-# Background function to generate load (sends requests to ingress URL)
-def _generate_load_thread(game_id: str, stop_event: threading.Event):
-    # Use the ingress URL (public domain) to trigger autoscaling
-    ingress_url = f"http://{DOMAIN}/snake/{game_id}"
-    
-    while not stop_event.is_set():
-        if game_id in request_rates:
-            target_rate = request_rates[game_id]["rate"]
-            if target_rate > 0:
-                interval = 1.0 / target_rate
-                try:
-                    response = requests.get(ingress_url, timeout=2.0)
-                    request_rates[game_id]["last_request"] = datetime.now()
-                except Exception as e:
-                    logger.debug(f"Error sending request to {ingress_url}: {e}")
-                time.sleep(interval)
-            else:
-                time.sleep(0.1)
-        else:
-            time.sleep(0.1)
+# Game manifests are compiled once per scaling profile (and again when the
+# templates change), then only get a game_id filled in
+game_manifests = GameManifests('./kubernetes', namespace=SNAKE_NAMESPACE, image=SNAKE_IMAGE, domain=DOMAIN,
+                               reload_interval=float(TEMPLATE_RELOAD_INTERVAL))
+
+# One LIST+WATCH of snake pods shared by every game, stream and request
+pod_informer = PodInformer(SNAKE_NAMESPACE, watch_timeout=int(POD_WATCH_TIMEOUT))
+
+# One namespace-wide metrics.k8s.io LIST per interval, shared by every game
+metrics_collector = PodMetricsCollector(SNAKE_NAMESPACE, interval=float(METRICS_INTERVAL))
+
+# Per-game limit/usage totals, updated incrementally from the two above
+resource_index = ResourceIndex()
+pod_informer.add_listener(resource_index.on_pod_event)
+metrics_collector.add_listener(resource_index.on_metrics)
+
+
+async def _start_components():
+    game_manifests.load()
+    game_manifests.start()
+    pod_informer.start()
+    metrics_collector.start()
+    teardown_queue.start()
+    lease_keeper.start()
+    game_reaper.start()
+    warm_pool.start()
+    load_engine.start()
+    load_coordinator.start()
+    metric_history.start()
+
+
+async def _stop_components():
+    for game_id in await warm_pool.stop():
+        try:
+            await snake_kill(game_id)
+        except Exception as e:
+            logger.error(f"Error tearing down warm game {game_id}: {e}")
+    await game_manifests.stop()
+    await metric_history.stop()
+    await game_reaper.stop()
+    game_feeds.stop()
+    await pod_evictor.stop()
+    await teardown_queue.stop()
+    await pod_informer.stop()
+    await metrics_collector.stop()
+    await load_coordinator.stop()
+    await load_engine.stop()
+    await lease_keeper.stop()
+    await store.close()
+
+
+# Readiness checks for /api/ready: templates compiled and the pod cache filled
+def readiness() -> Dict[str, bool]:
+    return {"manifests": game_manifests.loaded(), "pod_informer": pod_informer.synced()}
+
+
+# Counters, target rates and leases shared by every worker and replica
+store = create_store()
+
+# Holds game:{game_id} leases for streams and warm games while they are alive
+lease_keeper = LeaseKeeper(store, WORKER_ID, ttl=float(LEASE_TTL))
+
+# Kubernetes resources of finished games are deleted in the background, in batches
+teardown_queue = TeardownQueue(SNAKE_NAMESPACE, batch_size=int(TEARDOWN_BATCH_SIZE), max_attempts=int(TEARDOWN_MAX_ATTEMPTS))
+
+# Budgets for games and projected replicas; reservations are given back
+# once a game's resources have been deleted
+admission = AdmissionController(store, WORKER_ID, max_games=int(MAX_GAMES), max_replicas=int(MAX_REPLICAS),
+                                max_game_load_rate=float(MAX_GAME_LOAD_RATE),
+                                queue_timeout=float(ADMISSION_QUEUE_TIMEOUT), queue_size=int(ADMISSION_QUEUE_SIZE),
+                                retry_after=float(ADMISSION_RETRY_AFTER))
+teardown_queue.add_listener(admission.release)
+
+# Tears down games nobody holds a lease for, e.g. after a worker crashed, and
+# releases reservations of games that never got any resources
+game_reaper = GameReaper(SNAKE_NAMESPACE, teardown_queue, store, WORKER_ID, admission=admission,
+                         interval=float(REAPER_INTERVAL), grace=float(REAPER_GRACE))
+
+# Picks and deletes the pod eaten by /eat, in the background
+pod_evictor = PodEvictor(SNAKE_NAMESPACE, store, WORKER_ID, policy=EAT_POLICY,
+                         grace_period=int(EAT_GRACE_PERIOD) if EAT_GRACE_PERIOD != "" else None)
+
+# Single shared load generator, sends requests to each game's ingress URL
+load_engine = LoadEngine(f"http://{DOMAIN}/snake/{{game_id}}", max_concurrency=int(LOAD_MAX_CONCURRENCY))
+
+# Decides which worker drives each game's load, via leases in the store
+load_coordinator = LoadCoordinator(load_engine, store, WORKER_ID, lease_ttl=float(LEASE_TTL), max_total_rate=float(MAX_LOAD_RATE))
+
+# Fixed-size metric history per game, sampled from the same caches as METRICS frames
+metric_history = MetricHistory(pod_informer.game_ids, lambda game_id: _get_metrics(game_id),
+                               interval=float(HISTORY_INTERVAL), capacity=int(HISTORY_SIZE))
+
+
+# Load, counters and history of games whose resources are gone, however they
+# ended; /kill already did this for its own games, which is harmless to repeat
+async def _forget_games(game_ids: List[str]):
+    for game_id in game_ids:
+        await load_coordinator.remove(game_id)
+        await store.delete(f"eat:{game_id}")
+        metric_history.forget(game_id)
+
+
+teardown_queue.add_listener(_forget_games)
+
+
+# One upstream feed per streamed game, fanned out to the player and any spectators
+game_feeds = GameFeeds(pod_informer, lambda game_id: _sample_metrics(game_id), metrics_interval=float(STREAM_METRICS_INTERVAL),
+                       capacity=int(STREAM_BUFFER_SIZE), max_lag=float(STREAM_MAX_LAG))
+
+# Exported on /api/metrics. Gauges with callbacks are computed at scrape time,
+# so the hot paths only pay for the counters and timers
+ACTIVE_STREAMS = metrics.Gauge("podlands_streams_active", "Open game WebSocket streams")
+metrics.Gauge("podlands_games_active", "Games with at least one pod",
+              callback=lambda: len(pod_informer.game_ids()))
+metrics.Gauge("podlands_load_games", "Games this worker is generating load for",
+              callback=lambda: len(load_engine.games))
+metrics.Gauge("podlands_load_requests_in_flight", "Generated load requests in progress",
+              callback=lambda: load_engine.in_flight)
+metrics.Gauge("podlands_load_target_rate", "Target load requests/sec per game", ("game_id",),
+              callback=lambda: {(game_id,): game.rate for game_id, game in load_engine.games.items()})
+metrics.Gauge("podlands_load_achieved_rate", "Achieved load requests/sec per game", ("game_id",),
+              callback=lambda: {(game_id,): game.achieved_rate() for game_id, game in load_engine.games.items()})
+metrics.Gauge("podlands_stream_queue_depth", "Pod events waiting to be sent, summed over streams",
+              callback=lambda: sum(game_feeds.queue_depths()))
+metrics.Gauge("podlands_stream_queue_depth_max", "Pod events waiting to be sent on the most backed-up stream",
+              callback=lambda: max(game_feeds.queue_depths(), default=0))
+metrics.Gauge("podlands_stream_feeds_active", "Games with an upstream stream feed on this worker",
+              callback=lambda: game_feeds.stats()["feeds"])
+GET_METRICS_SECONDS = metrics.Histogram("podlands_get_metrics_seconds", "Time spent building a METRICS frame")
+SEND_SECONDS = metrics.Histogram("podlands_stream_send_seconds", "Time spent sending a WebSocket frame", ("type",))
+INIT_SECONDS = metrics.Histogram("podlands_init_seconds", "Time taken by /init, by result "
+                                 "(warm, created, bad_profile, rejected, error)", ("result",))
+
+
+# /init latency for /stats, estimated from INIT_SECONDS over games handed out
+def _init_latency() -> Dict:
+    served = (("warm",), ("created",))
+    return {
+        "count": INIT_SECONDS.count(*served),
+        "p50_seconds": round(INIT_SECONDS.quantile(0.50, *served), 4),
+        "p99_seconds": round(INIT_SECONDS.quantile(0.99, *served), 4),
+    }
 
 
 # Helper function to get metrics for a game
 def _get_metrics(game_id: str) -> Dict:
     try:
-        pods = core.list_namespaced_pod(SNAKE_NAMESPACE, label_selector=f"game_id={game_id}")
-        
-        total_cpu_usage = 0.0
-        total_memory_usage = 0.0
-        total_cpu_limit = 0.0
-        total_memory_limit = 0.0
-        running_pods = 0
-        
-        for pod in pods.items:
-            if pod.status.phase == "Running":
-                running_pods += 1
-                # Get resource limits from pod spec
-                if pod.spec.containers:
-                    container = pod.spec.containers[0]
-                    if container.resources and container.resources.limits:
-                        limits = container.resources.limits
-                        if limits.get("cpu"):
-                            cpu_limit_str = str(limits["cpu"])
-                            # Convert to millicores (e.g., "100m" -> 0.1, "1" -> 1.0)
-                            if cpu_limit_str.endswith("m"):
-                                total_cpu_limit += float(cpu_limit_str[:-1]) / 1000.0
-                            else:
-                                total_cpu_limit += float(cpu_limit_str)
-                        
-                        if limits.get("memory"):
-                            memory_limit_str = str(limits["memory"])
-                            # Convert to bytes (e.g., "24Mi" -> 24 * 1024 * 1024)
-                            if memory_limit_str.endswith("Mi"):
-                                total_memory_limit += float(memory_limit_str[:-2]) * 1024 * 1024
-                            elif memory_limit_str.endswith("Ki"):
-                                total_memory_limit += float(memory_limit_str[:-2]) * 1024
-                            elif memory_limit_str.endswith("Gi"):
-                                total_memory_limit += float(memory_limit_str[:-2]) * 1024 * 1024 * 1024
-                            else:
-                                total_memory_limit += float(memory_limit_str)
-                
-                # Try to get actual usage from metrics API
-                if METRICS_AVAILABLE:
-                    try:
-                        pod_metrics = metrics_api.get_namespaced_custom_object(
-                            group="metrics.k8s.io",
-                            version="v1beta1",
-                            namespace=SNAKE_NAMESPACE,
-                            plural="pods",
-                            name=pod.metadata.name
-                        )
-                        if "containers" in pod_metrics:
-                            for container in pod_metrics["containers"]:
-                                if "usage" in container:
-                                    usage = container["usage"]
-                                    if "cpu" in usage:
-                                        cpu_str = usage["cpu"]
-                                        # Parse CPU (e.g., "100m" or "1n")
-                                        if cpu_str.endswith("n"):
-                                            total_cpu_usage += float(cpu_str[:-1]) / 1000000000.0
-                                        elif cpu_str.endswith("u"):
-                                            total_cpu_usage += float(cpu_str[:-1]) / 1000000.0
-                                        elif cpu_str.endswith("m"):
-                                            total_cpu_usage += float(cpu_str[:-1]) / 1000.0
-                                        else:
-                                            total_cpu_usage += float(cpu_str)
-                                    
-                                    if "memory" in usage:
-                                        memory_str = usage["memory"]
-                                        # Parse memory (e.g., "24Mi")
-                                        if memory_str.endswith("Mi"):
-                                            total_memory_usage += float(memory_str[:-2]) * 1024 * 1024
-                                        elif memory_str.endswith("Ki"):
-                                            total_memory_usage += float(memory_str[:-2]) * 1024
-                                        elif memory_str.endswith("Gi"):
-                                            total_memory_usage += float(memory_str[:-2]) * 1024 * 1024 * 1024
-                                        else:
-                                            total_memory_usage += float(memory_str)
-                    except Exception as e:
-                        logger.debug(f"Could not get metrics for pod {pod.metadata.name}: {e}")
-                        # Fall back to estimating usage (assume 50% of limit if no metrics)
-                        if total_cpu_limit > 0:
-                            total_cpu_usage = total_cpu_limit * 0.5
-                        if total_memory_limit > 0:
-                            total_memory_usage = total_memory_limit * 0.5
+        # Limits and usage are kept up to date per pod by the informer and
+        # metrics collector, so this is a cached lookup on most ticks
+        running_pods, total_cpu_usage, total_memory_usage, total_cpu_limit, total_memory_limit = resource_index.totals(game_id)
         
         # Calculate percentages
         cpu_percent = (total_cpu_usage / total_cpu_limit * 100) if total_cpu_limit > 0 else 0.0
         memory_percent = (total_memory_usage / total_memory_limit * 100) if total_memory_limit > 0 else 0.0
         
-        # Get requests/sec from tracking
+        # Get achieved requests/sec from the load engine
         requests_per_sec = 0.0
-        if game_id in request_rates:
-            requests_per_sec = request_rates[game_id].get("rate", 0.0)
+        target_requests_per_sec = 0.0
+        load_errors = 0
+        load = load_coordinator.stats(game_id)
+        if load:
+            requests_per_sec = load["achieved_rate"]
+            target_requests_per_sec = load["target_rate"]
+            load_errors = load["errors"]
         
         # Network I/O is harder to get without metrics server, return placeholder
         network_io = "N/A"
@@ -166,6 +222,8 @@ def _get_metrics(game_id: str) -> Dict:
             "memory_percent": round(memory_percent, 2),
             "network_io": network_io,
             "requests_per_sec": round(requests_per_sec, 2),
+            "target_requests_per_sec": round(target_requests_per_sec, 2),
+            "load_errors": load_errors,
             "running_pods": running_pods
         }
     except Exception as e:
@@ -178,245 +236,318 @@ def _get_metrics(game_id: str) -> Dict:
         }
 
 
-# Function to get pods for game id, also add watcher for pods
-def get_pods(game_id: str):
-    try:
-        pods = core.list_namespaced_pod(SNAKE_NAMESPACE, label_selector=f"game_id={game_id}")
-        pods_list = []
-        for pod in pods.to_dict()["items"]:
-            pods_list.append({
-                "name": pod["metadata"]["name"],
-                "status": pod["status"]["phase"]
-            })
-        return pods_list
-    except Exception as e:
-        logger.error(f"Error getting pods for game {game_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+# Health of the shared caches and collectors
+@router.get("/stats")
+async def snake_stats():
+    return {
+        "games": len(pod_informer.game_ids()),
+        "informer": pod_informer.stats(),
+        "metrics_collector": metrics_collector.stats(),
+        "init_latency": _init_latency(),
+        "warm_pool": warm_pool.stats(),
+        "eat": pod_evictor.stats(),
+        "teardown": teardown_queue.stats(),
+        "reaper": game_reaper.stats(),
+        "history": metric_history.stats(),
+        "streams": game_feeds.stats()
+    }
 
-# Create new instance of game:
-@router.post("/init")
-def snake_init():
-    logger.info(f"Initializing game")
 
+# Create the Kubernetes resources for a new game, all four at once
+async def _create_game(profile: str = DEFAULT_PROFILE) -> str:
     # Generate a unique game id for the deployment
     game_id = str(uuid.uuid4())[:8]
+    manifests = game_manifests.render(game_id, profile)
 
-    # Render the deployment, service, and ingress templates
-    deployment = yaml.safe_load(env.get_template("snake/deployment.yaml").render(game_id=game_id, image=SNAKE_IMAGE, namespace=SNAKE_NAMESPACE))
-    service = yaml.safe_load(env.get_template("snake/service.yaml").render(game_id=game_id, namespace=SNAKE_NAMESPACE))
-    scaling = yaml.safe_load(env.get_template("snake/autoscaling.yaml").render(game_id=game_id, namespace=SNAKE_NAMESPACE))
-    ingress = yaml.safe_load(env.get_template("snake/ingress.yaml").render(game_id=game_id, namespace=SNAKE_NAMESPACE, domain=DOMAIN))
+    # Reserve the most replicas the game's HPA can scale to
+    await admission.admit(game_id, int(manifests["autoscaling"]["spec"]["maxReplicas"]))
+
+    results = await asyncio.gather(
+        kube.call(kube.apps.create_namespaced_deployment, SNAKE_NAMESPACE, manifests["deployment"]),
+        kube.call(kube.core.create_namespaced_service, SNAKE_NAMESPACE, manifests["service"]),
+        kube.call(kube.autoscaling.create_namespaced_horizontal_pod_autoscaler, SNAKE_NAMESPACE, manifests["autoscaling"]),
+        kube.call(kube.net.create_namespaced_ingress, SNAKE_NAMESPACE, manifests["ingress"]),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        # Don't leave a half-created game behind
+        teardown_queue.enqueue(game_id)
+        raise errors[0]
+    return game_id
+
+
+# Warm games hold their lease until /init hands them out
+async def _create_warm_game() -> str:
+    game_id = await _create_game()
+    await lease_keeper.hold(f"game:{game_id}")
+    return game_id
+
+
+# Idle games handed out by /init, refilled in the background
+warm_pool = WarmPool(_create_warm_game, size=int(WARM_POOL_SIZE))
 
-    api.create_namespaced_deployment(SNAKE_NAMESPACE, deployment)
-    core.create_namespaced_service(SNAKE_NAMESPACE, service)
-    autoscaling.create_namespaced_horizontal_pod_autoscaler(SNAKE_NAMESPACE, scaling)
-    net.create_namespaced_ingress(SNAKE_NAMESPACE, ingress)
-    return {"status": "initialized", "game_id": game_id}
 
+# Scaling profiles /init accepts
+@router.get("/profiles")
+async def snake_profiles():
+    return {
+        "default": DEFAULT_PROFILE,
+        "profiles": {name: game_manifests.replicas(name) for name in game_manifests.profiles()}
+    }
+
+
+# Create new instance of game:
+@router.post("/init")
+async def snake_init(profile: str = DEFAULT_PROFILE):
+    logger.info(f"Initializing game ({profile} profile)")
+    start = time.perf_counter()
+    result = "error"
+
+    try:
+        # Warm games are created with the default profile
+        game_id = warm_pool.take() if profile == DEFAULT_PROFILE else None
+        if game_id is None:
+            try:
+                game_id = await _create_game(profile)
+            except UnknownProfile as e:
+                result = "bad_profile"
+                raise HTTPException(status_code=400, detail=str(e))
+            except AdmissionRejected as e:
+                result = "rejected"
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+            source = "created"
+        else:
+            await lease_keeper.release(f"game:{game_id}")
+            source = "warm"
+        # Keep the reaper away until the player's stream connects, on whichever
+        # worker, and holds game:{game_id}
+        await store.acquire_lease(f"grace:{game_id}", WORKER_ID, float(REAPER_GRACE))
+        result = source
+    finally:
+        INIT_SECONDS.observe(time.perf_counter() - start, result)
+
+    return {"status": "initialized", "game_id": game_id}
 
-# Track how many times food has been eaten per game (to delete pods less frequently)
-eat_counters: Dict[str, int] = {}
 
 # Pod has been consumed
 @router.post("/eat/{game_id}")
-def snake_eat(game_id: str):
-    logger.info(f"Pod {game_id} has been eaten")
+async def snake_eat(game_id: GameId):
+    bind_game(game_id)
+    # Called on every food item, so at most one line per game per second
+    logger.info(f"Pod {game_id} has been eaten", extra=throttle(key=f"eat:{game_id}", rate=1))
     
-    # Increment counter for this game
-    if game_id not in eat_counters:
-        eat_counters[game_id] = 0
-    eat_counters[game_id] += 1
+    # Increment counter for this game (atomic across workers)
+    eat_count = await store.incr(f"eat:{game_id}")
     
     # Only delete pod every N food items to allow metrics to accumulate
-    should_delete_pod = eat_counters[game_id] % int(PODS_DELETE_INTERVAL) == 0
+    should_delete_pod = eat_count % int(PODS_DELETE_INTERVAL) == 0
     
+    pod = None
     if should_delete_pod:
-        pods = get_pods(game_id)
-        if len(pods) == 0:
-            logger.warning(f"No pod found for game {game_id}")
-            raise HTTPException(status_code=404, detail="No pod found for game.")
-        # Kill first Running pod in list
-        for pod in pods:
-            if pod["status"] == "Running":
-                core.delete_namespaced_pod(pod["name"], SNAKE_NAMESPACE)
-                logger.info(f"Successfully deleted pod {pod['name']} (food count: {eat_counters[game_id]})")
-                break
+        # Victim comes from the informer cache and is deleted in the
+        # background; a game that is briefly at zero pods just skips a turn
+        pod = await pod_evictor.evict(pod_informer.pods(game_id),
+                                      usage=lambda name: resource_index.pod_cpu_usage(game_id, name))
+        if pod is None:
+            logger.warning(f"No Running pod to eat for game {game_id}", extra=throttle(key=f"eat-none:{game_id}", rate=0.2))
+        else:
+            logger.info(f"Eating pod {pod} (food count: {eat_count})")
     
-    return {"status": "eaten", "game_id": game_id, "pod_deleted": should_delete_pod}
+    return {"status": "eaten", "game_id": game_id, "pod_deleted": pod is not None, "pod": pod}
 
 
 # Generate load (increase requests/sec) - sends requests to ingress URL
 @router.post("/load/{game_id}")
-def generate_load(game_id: str, requests_per_sec: Optional[float] = None):
+async def generate_load(game_id: GameId,
+                        requests_per_sec: Annotated[Optional[float], Query(ge=0, allow_inf_nan=False)] = None):
+    bind_game(game_id)
     try:
-        # If requests_per_sec not provided, increment from current rate
-        if game_id not in request_rates:
-            request_rates[game_id] = {"rate": 0.0, "last_update": datetime.now()}
-        
+        # Target rates live in the shared store; whichever worker holds the
+        # game's load lease picks the new target up
         if requests_per_sec is None:
-            # Increment by 5 requests/sec each time food is eaten
-            current_rate = request_rates[game_id]["rate"]
-            requests_per_sec = current_rate + float(LOAD_INCREMENT)
+            # Increment from the current rate each time food is eaten; the
+            # cap is applied in the same atomic update, so no worker ever
+            # sees a rate over it
+            requests_per_sec = await load_coordinator.add_rate(game_id, float(LOAD_INCREMENT), admission.max_rate())
         else:
-            requests_per_sec = float(requests_per_sec)
+            requests_per_sec = admission.clamp_rate(float(requests_per_sec))
+            await load_coordinator.set_rate(game_id, requests_per_sec)
         
-        # Update tracking
-        request_rates[game_id]["rate"] = requests_per_sec
-        request_rates[game_id]["last_update"] = datetime.now()
-        
-        # Start or restart load generator thread if not already running
-        if game_id not in load_generators or not load_threads.get(game_id) or not load_threads[game_id].is_alive():
-            # Stop existing if any
-            if game_id in load_generators:
-                load_generators[game_id].set()
-            
-            # Create new stop event and thread
-            stop_event = threading.Event()
-            load_generators[game_id] = stop_event
-            thread = threading.Thread(target=_generate_load_thread, args=(game_id, stop_event), daemon=True)
-            load_threads[game_id] = thread
-            thread.start()
-        
-        logger.info(f"Updated load generation to {requests_per_sec} req/s for game {game_id}")
+        logger.info(f"Updated load generation to {requests_per_sec} req/s for game {game_id}",
+                    extra=throttle(key=f"load:{game_id}", rate=1))
         return {
             "status": "load_generated",
             "game_id": game_id,
-            "requests_per_sec": requests_per_sec
+            "requests_per_sec": requests_per_sec,
+            # Lower than requested while the global load budget is tight
+            "allowed_requests_per_sec": load_coordinator.allowed_rate(requests_per_sec)
         }
     except Exception as e:
         logger.error(f"Error generating load for game {game_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Current use of the game, replica and load budgets
+@router.get("/budget")
+async def snake_budget():
+    return {
+        **await admission.usage(),
+        "load_rate": {**load_coordinator.budget(), "per_game_limit": admission.max_game_load_rate or None}
+    }
+
+
+# Downsampled metric history of a game, e.g. to backfill charts after a reconnect:
+# min/max/avg per bucket over the last `window` seconds
+@router.get("/history/{game_id}")
+async def snake_history(game_id: GameId, window: float = 600, buckets: int = 60):
+    bind_game(game_id)
+    history = metric_history.series(game_id, window, min(buckets, 1000))
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"No metric history for game {game_id}")
+    return history
+
+
+# Achieved rate, errors and latency histogram of a game's generated load
+@router.get("/load/{game_id}")
+async def load_stats(game_id: GameId):
+    stats = load_coordinator.stats(game_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No load generated for game.")
+    return {"game_id": game_id, **stats}
+
+
 # Game over
 @router.post("/kill/{game_id}")
-def snake_kill(game_id: str):
+async def snake_kill(game_id: GameId):
     logger.info(f"Killing game {game_id}")
-    api.delete_namespaced_deployment(f"snake-{game_id}", SNAKE_NAMESPACE)
-    core.delete_namespaced_service(f"snake-{game_id}", SNAKE_NAMESPACE)
-    autoscaling.delete_namespaced_horizontal_pod_autoscaler(f"snake-{game_id}", SNAKE_NAMESPACE)
-    net.delete_namespaced_ingress(f"snake-{game_id}", SNAKE_NAMESPACE)
-    # Clean up request rate tracking and load generators
-    if game_id in request_rates:
-        del request_rates[game_id]
-    if game_id in load_generators:
-        load_generators[game_id].set()
-        del load_generators[game_id]
-    if game_id in load_threads:
-        del load_threads[game_id]
-    if game_id in eat_counters:
-        del eat_counters[game_id]
-    logger.info(f"Successfully killed game {game_id}")
+    # Kubernetes resources are deleted in the background, with retries
+    teardown_queue.enqueue(game_id)
+    # Clean up request rate tracking, load generation and counters
+    await load_coordinator.remove(game_id)
+    await store.delete(f"eat:{game_id}")
+    metric_history.forget(game_id)
+    game_feeds.end(game_id)
+    logger.info(f"Queued teardown of game {game_id}")
     return {"status": "killed", "game_id": game_id}
 
 
 
 
+# Metrics for a game's stream feed, computed once however many viewers it has
+def _sample_metrics(game_id: str) -> Dict:
+    with GET_METRICS_SECONDS.time():
+        return _get_metrics(game_id)
+
+
+# Send one frame, as JSON text or MessagePack bytes if the client opted in
+async def _send_frame(websocket: WebSocket, frame: Dict, encoding: str):
+    with SEND_SECONDS.time(frame["type"]):
+        if encoding == "msgpack":
+            import msgpack
+            await websocket.send_bytes(msgpack.packb(frame))
+        else:
+            await websocket.send_json(frame)
+
+
+# Resolves once the client goes away (we never expect client messages)
+async def _wait_for_disconnect(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
 # Stream live updates of snake game for specific namespace
 @router.websocket("/stream/{game_id}")
-async def snake_stream(websocket: WebSocket, game_id: str):
+async def snake_stream(websocket: WebSocket, game_id: GameId, encoding: str = "json", spectate: bool = False):
+    bind_game(game_id)
     logger.info("New WebSocket connection accepted")
     await websocket.accept()
+    ACTIVE_STREAMS.inc()
+    close_code = 1000
     
     try:
+        # An open player stream keeps the game alive across workers;
+        # spectators only watch
+        if not spectate:
+            await lease_keeper.hold(f"game:{game_id}")
+
         # Send initial connection confirmation
-        await websocket.send_json({
+        await _send_frame(websocket, {
             "type": "CONNECTED",
             "message": "WebSocket connected successfully"
-        })
+        }, encoding)
 
-        w = watch.Watch()
-        executor = ThreadPoolExecutor(max_workers=1)
-        event_queue = Queue()
-        watch_stopped = threading.Event()
-        
-        def blocking_watch():
-            try:
-                for event in w.stream(core.list_namespaced_pod, SNAKE_NAMESPACE, label_selector=f"game_id={game_id}"):
-                    if watch_stopped.is_set():
-                        break
-                    event_queue.put({
-                        "type": event["type"],  # ADDED, MODIFIED, DELETED
-                        "pod": event['object'].metadata.name,
-                        "status": event['object'].status.phase
-                    })
-            except Exception as e:
-                logger.error(f"Error in watch stream: {e}")
-                if not watch_stopped.is_set():
-                    event_queue.put({
-                        "type": "ERROR",
-                        "message": f"Watch error: {str(e)}"
-                    })
-        
-        # Run blocking watch in thread pool
-        future = executor.submit(blocking_watch)
+        # Every viewer of the game shares one feed of pod events and metrics;
+        # we only get a bounded outbox of frames to send
+        outbox = game_feeds.join(game_id)
+        disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+        ready = asyncio.create_task(outbox.wait())
+        batch_window = float(STREAM_BATCH_WINDOW)
+        send_timeout = float(STREAM_MAX_LAG)
         
-        # Track last metrics send time
-        last_metrics_send = datetime.now()
-        metrics_interval = timedelta(seconds=1)  # Send metrics every 1 second
-        
-        # Process events from queue and keep connection alive
+        # Sleep until there is something to send or the client leaves
         try:
             while True:
-                # Check for messages from client (with timeout)
-                try:
-                    await asyncio.wait_for(websocket.receive_text(), timeout=0.5)
-                except asyncio.TimeoutError:
-                    pass
-                except WebSocketDisconnect:
+                await asyncio.wait({disconnected, ready}, return_when=asyncio.FIRST_COMPLETED)
+                
+                if disconnected.done():
                     logger.info("Client disconnected from WebSocket")
                     break
+                if outbox.closed:
+                    break
                 
-                # Process events from watch queue
-                while not event_queue.empty():
+                # Give closely spaced events a moment to arrive and send them as one frame
+                if batch_window > 0:
+                    await asyncio.sleep(batch_window)
+                for frame in outbox.drain():
                     try:
-                        event = event_queue.get_nowait()
-                        await websocket.send_json(event)
+                        await asyncio.wait_for(_send_frame(websocket, frame, encoding), send_timeout)
+                    except asyncio.TimeoutError:
+                        outbox.close("timeout")
+                        break
                     except WebSocketDisconnect:
                         logger.info("Client disconnected while sending WebSocket message")
                         raise
                     except Exception as e:
-                        logger.error(f"Error sending WebSocket event: {e}")
-                
-                # Send metrics periodically
-                now = datetime.now()
-                if now - last_metrics_send >= metrics_interval:
-                    try:
-                        metrics = _get_metrics(game_id)
-                        await websocket.send_json({
-                            "type": "METRICS",
-                            **metrics
-                        })
-                        last_metrics_send = now
-                    except WebSocketDisconnect:
-                        logger.info("Client disconnected while sending metrics")
-                        raise
-                    except Exception as e:
-                        logger.error(f"Error sending metrics: {e}")
-                
-                # Check if watch thread stopped
-                if future.done():
+                        logger.error(f"Error sending WebSocket {frame['type']} frame: {e}")
+                if outbox.closed:
                     break
-                    
+                ready = asyncio.create_task(outbox.wait())
+
+            if outbox.closed in SLOW:
+                logger.warning(f"Closing stream of game {game_id}: client fell behind ({outbox.closed})")
+                close_code = 1013
         except WebSocketDisconnect:
             logger.info("WebSocket disconnected")
         finally:
-            watch_stopped.set()
-            executor.shutdown(wait=False)
+            disconnected.cancel()
+            ready.cancel()
+            game_feeds.leave(game_id, outbox)
     except Exception as e:
         logger.error(f"Error in stream_pods: {e}")
     finally:
+        ACTIVE_STREAMS.dec()
         try:
             if websocket.client_state != WebSocketState.DISCONNECTED:
-                await websocket.close()
+                await websocket.close(code=close_code)
             logger.info("WebSocket connection closed")
         except Exception as e:
             logger.error(f"Error closing WebSocket: {e}")
         
-        # Always call snake_kill when WebSocket closes
-        try:
-            snake_kill(game_id)
-            logger.info(f"Successfully called snake_kill for game {game_id}")
-        except Exception as e:
-            logger.error(f"Error calling snake_kill for game {game_id}: {e}")
+        # End the game when the player's WebSocket closes; the Kubernetes
+        # resources are torn down in the background. A player we cut off for
+        # falling behind (1013) is expected to reconnect instead, so the game
+        # gets the same grace period as after /init and the reaper ends it
+        # if they don't come back.
+        if not spectate:
+            try:
+                await lease_keeper.release(f"game:{game_id}")
+                if close_code == 1013:
+                    await store.acquire_lease(f"grace:{game_id}", WORKER_ID, float(REAPER_GRACE))
+                else:
+                    await snake_kill(game_id)
+            except Exception as e:
+                logger.error(f"Error ending stream of game {game_id}: {e}")
 
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the backend's packages (common, routers, benchmarks) the way
+# main.py does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,180 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from common import fanout
+from common.fanout import Outbox
+
+
+def pod(name, phase="Running"):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name), status=SimpleNamespace(phase=phase))
+
+
+def event(event_type, name, status="Running"):
+    return {"type": event_type, "pod": name, "status": status}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fanout, "time", clock)
+    return clock
+
+
+def test_single_event_is_sent_as_is():
+    outbox = Outbox(lambda: [])
+    outbox.put_event(event("ADDED", "a"))
+    assert outbox.drain() == [event("ADDED", "a")]
+    assert outbox.drain() == []
+
+
+def test_several_events_go_out_as_one_batch_in_order():
+    outbox = Outbox(lambda: [])
+    outbox.put_event(event("ADDED", "a"))
+    outbox.put_event(event("ADDED", "b"))
+    outbox.put_event(event("DELETED", "a"))
+    assert outbox.drain() == [{"type": "BATCH", "events": [
+        event("ADDED", "a"), event("ADDED", "b"), event("DELETED", "a")]}]
+
+
+def test_modified_is_merged_into_the_waiting_event_for_the_pod():
+    outbox = Outbox(lambda: [])
+    added = event("ADDED", "a", "Pending")
+    outbox.put_event(added)
+    outbox.put_event(event("MODIFIED", "a", "Running"))
+    outbox.put_event(event("MODIFIED", "a", "Succeeded"))
+    assert outbox.pending() == 1
+    assert outbox.drain() == [event("ADDED", "a", "Succeeded")]
+    # Events are shared between outboxes, so the caller's dict is untouched
+    assert added["status"] == "Pending"
+
+
+def test_modified_after_delete_or_drain_is_not_merged():
+    outbox = Outbox(lambda: [])
+    outbox.put_event(event("ADDED", "a"))
+    outbox.put_event(event("DELETED", "a"))
+    outbox.put_event(event("MODIFIED", "a"))
+    assert outbox.pending() == 3
+    outbox.drain()
+    outbox.put_event(event("MODIFIED", "a", "Failed"))
+    assert outbox.drain() == [event("MODIFIED", "a", "Failed")]
+
+
+def test_only_the_latest_metrics_are_kept_and_sent_as_a_delta():
+    outbox = Outbox(lambda: [])
+    outbox.set_metrics({"cpu_percent": 1, "running_pods": 2})
+    outbox.set_metrics({"cpu_percent": 2, "running_pods": 2})
+    assert outbox.drain() == [{"type": "METRICS", "cpu_percent": 2, "running_pods": 2}]
+    outbox.set_metrics({"cpu_percent": 2, "running_pods": 3})
+    assert outbox.drain() == [{"type": "METRICS", "running_pods": 3}]
+    # Nothing changed, nothing to send
+    outbox.set_metrics({"cpu_percent": 2, "running_pods": 3})
+    assert outbox.drain() == []
+
+
+def test_events_go_out_before_metrics():
+    outbox = Outbox(lambda: [])
+    outbox.set_metrics({"cpu_percent": 1})
+    outbox.put_event(event("ADDED", "a"))
+    assert [frame["type"] for frame in outbox.drain()] == ["ADDED", "METRICS"]
+
+
+def test_overflow_replaces_the_backlog_with_one_sync(clock):
+    pods = [pod("a", "Running"), pod("c", "Pending")]
+    outbox = Outbox(lambda: pods, capacity=3, max_lag=10)
+    outbox.put_event(event("ADDED", "a"))
+    outbox.put_event(event("ADDED", "b"))
+    outbox.drain()
+
+    for index in range(5):
+        outbox.put_event(event("ADDED", f"x{index}"))
+    assert outbox.pending() == 0
+    # Diffed against what the client was told: a and b
+    assert outbox.drain() == [{
+        "type": "SYNC",
+        "added": [{"pod": "c", "status": "Pending"}],
+        "modified": [{"pod": "a", "status": "Running"}],
+        "deleted": ["b"],
+    }]
+    assert outbox.closed is None
+
+    # The SYNC becomes the client's view for the next one
+    pods.append(pod("d"))
+    for index in range(5):
+        outbox.put_event(event("ADDED", f"y{index}"))
+    sync = outbox.drain()[0]
+    assert sync["added"] == [{"pod": "d", "status": "Running"}]
+    assert sync["deleted"] == []
+
+
+def test_outbox_that_stays_behind_for_max_lag_is_closed(clock):
+    outbox = Outbox(lambda: [], capacity=2, max_lag=10)
+    for index in range(3):
+        outbox.put_event(event("ADDED", f"a{index}"))
+    clock.now += 5
+    outbox.put_event(event("ADDED", "b"))
+    assert outbox.closed is None
+    clock.now += 6
+    outbox.put_event(event("ADDED", "c"))
+    assert outbox.closed == "lagging"
+
+    # Closed outboxes take nothing more
+    outbox.put_event(event("ADDED", "d"))
+    outbox.set_metrics({"cpu_percent": 1})
+    assert outbox.pending() == 0
+
+
+def test_lag_is_reset_only_once_the_client_keeps_up(clock):
+    outbox = Outbox(lambda: [], capacity=2, max_lag=10)
+    for index in range(3):
+        outbox.put_event(event("ADDED", f"a{index}"))
+    clock.now += 8
+    # A SYNC alone doesn't count as catching up
+    outbox.drain()
+    for index in range(3):
+        outbox.put_event(event("ADDED", f"b{index}"))
+    clock.now += 3
+    outbox.put_event(event("ADDED", "c"))
+    assert outbox.closed == "lagging"
+
+    outbox = Outbox(lambda: [], capacity=2, max_lag=10)
+    for index in range(3):
+        outbox.put_event(event("ADDED", f"a{index}"))
+    clock.now += 8
+    outbox.drain()
+    outbox.put_event(event("ADDED", "b"))
+    outbox.drain()
+    clock.now += 8
+    for index in range(3):
+        outbox.put_event(event("ADDED", f"c{index}"))
+    assert outbox.closed is None
+    clock.now += 11
+    outbox.put_event(event("ADDED", "d"))
+    assert outbox.closed == "lagging"
+
+
+def test_wait_returns_once_there_is_something_to_send():
+    async def scenario():
+        outbox = Outbox(lambda: [])
+        waiter = asyncio.create_task(outbox.wait())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        outbox.put_event(event("ADDED", "a"))
+        await asyncio.wait_for(waiter, 1)
+
+        outbox.drain()
+        waiter = asyncio.create_task(outbox.wait())
+        outbox.close("ended")
+        await asyncio.wait_for(waiter, 1)
+        assert outbox.closed == "ended"
+
+    asyncio.run(scenario())
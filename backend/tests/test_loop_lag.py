@@ -0,0 +1,36 @@
+# Many concurrent game streams must not stall the event loop.
+#
+# Runs the load test's init and stream scenarios (benchmarks.fake_k8s as the
+# Kubernetes API, benchmarks.serve as the app) and fails if the server's p99
+# event-loop lag goes over MAX_LOOP_LAG in any of them.
+#
+# Run from the backend directory:  python -m pytest tests
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STREAMS = 50
+MAX_LOOP_LAG = 0.1
+
+
+def test_streams_keep_loop_lag_low(tmp_path):
+    pytest.importorskip("aiohttp")
+    pytest.importorskip("kubernetes_asyncio")
+    output = tmp_path / "result.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.loadtest", "run", "--scenarios", "init", "stream",
+         "--games", "20", "--streams", str(STREAMS), "--stream-seconds", "5",
+         "--max-loop-lag", str(MAX_LOOP_LAG), "--output", str(output)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+
+    scenarios = json.loads(output.read_text())["scenarios"]
+    stream = scenarios["stream"]
+    assert stream["errors"] == 0
+    assert stream["loop_lag"]["samples"] > 0
+    assert stream["loop_lag"]["p99_seconds"] <= MAX_LOOP_LAG
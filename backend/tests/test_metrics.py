@@ -0,0 +1,35 @@
+import pytest
+
+from common.metrics import Histogram
+
+
+def histogram(*observations):
+    histogram = Histogram("test_seconds", "Test", ("result",), buckets=(0.1, 0.5, 1.0))
+    for value, result in observations:
+        histogram.observe(value, result)
+    return histogram
+
+
+def test_empty_histogram_has_no_latency():
+    assert histogram().count() == 0
+    assert histogram().quantile(0.99) == 0.0
+
+
+def test_quantile_is_interpolated_within_its_bucket():
+    h = histogram(*[(0.05, "ok")] * 50, *[(0.3, "ok")] * 50)
+    assert h.count() == 100
+    assert h.quantile(0.50) == pytest.approx(0.1)
+    assert h.quantile(0.75) == pytest.approx(0.3)
+    assert h.quantile(0.99) == pytest.approx(0.492)
+
+
+def test_quantile_past_the_last_bound_is_capped_at_it():
+    h = histogram((0.05, "ok"), (7.0, "ok"))
+    assert h.quantile(0.99) == 1.0
+
+
+def test_quantile_only_counts_the_given_label_sets():
+    h = histogram(*[(0.05, "ok")] * 10, *[(0.8, "error")] * 90)
+    assert h.count(("ok",)) == 10
+    assert h.quantile(0.99, ("ok",)) == pytest.approx(0.099)
+    assert h.quantile(0.99, ("ok",), ("error",)) > 0.5
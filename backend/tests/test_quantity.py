@@ -0,0 +1,70 @@
+import pytest
+
+from common.quantity import parse_quantity
+
+KI, MI, GI, TI, PI, EI = (2.0 ** power for power in (10, 20, 30, 40, 50, 60))
+
+
+@pytest.mark.parametrize("quantity, expected", [
+    # Plain numbers and signs
+    ("0", 0.0),
+    ("2", 2.0),
+    ("+2", 2.0),
+    ("-2", -2.0),
+    ("1.5", 1.5),
+    (".5", 0.5),
+    ("5.", 5.0),
+    ("-.5", -0.5),
+    (3, 3.0),
+    (0.25, 0.25),
+    # binarySI
+    ("1Ki", KI),
+    ("1Mi", MI),
+    ("24Mi", 24 * MI),
+    ("1Gi", GI),
+    ("1.5Gi", 1.5 * GI),
+    ("1Ti", TI),
+    ("1Pi", PI),
+    ("1Ei", EI),
+    # decimalSI
+    ("1n", 1e-9),
+    ("250u", 250e-6),
+    ("100m", 0.1),
+    ("1k", 1e3),
+    ("1M", 1e6),
+    ("1.5G", 1.5e9),
+    ("1T", 1e12),
+    ("1P", 1e15),
+    ("1E", 1e18),
+    ("-100m", -0.1),
+    # Decimal exponents: "E" followed by digits is an exponent, not exa
+    ("1E3", 1e3),
+    ("1e3", 1e3),
+    ("2e-3", 2e-3),
+    ("1E+2", 1e2),
+    (".5e1", 5.0),
+    # Surrounding whitespace
+    (" 100m ", 0.1),
+])
+def test_parse_quantity(quantity, expected):
+    assert parse_quantity(quantity) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("quantity", [
+    "",
+    "1e",
+    "1E+",
+    "m",
+    ".",
+    "1.2.3",
+    "1KI",
+    "1mi",
+    "1K",
+    "1 Mi",
+    "abc",
+    "1Mi3",
+    "--1",
+])
+def test_parse_quantity_rejects(quantity):
+    with pytest.raises(ValueError):
+        parse_quantity(quantity)
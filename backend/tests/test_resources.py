@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from common.resources import ESTIMATED_USAGE, GameResources, ResourceIndex
+
+MI = 2.0 ** 20
+
+
+def pod(name, phase="Running", cpu="500m", memory="256Mi", game_id="g1"):
+    resources = SimpleNamespace(limits={"cpu": cpu, "memory": memory})
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, labels={"app": "snake", "game_id": game_id}),
+        spec=SimpleNamespace(containers=[SimpleNamespace(resources=resources)]),
+        status=SimpleNamespace(phase=phase),
+    )
+
+
+def test_totals_sum_running_pods_only():
+    game = GameResources()
+    game.set_pod("a", True, 0.5, 256 * MI)
+    game.set_pod("b", True, 1.0, 512 * MI)
+    game.set_pod("c", False, 2.0, 1024 * MI)
+    game.set_usage("a", 0.25, 100 * MI)
+    game.set_usage("b", 0.5, 200 * MI)
+    game.set_usage("c", 1.0, 300 * MI)
+    assert game.totals() == pytest.approx((2, 0.75, 300 * MI, 1.5, 768 * MI))
+
+
+def test_totals_estimate_pods_without_usage_from_their_own_limits():
+    game = GameResources()
+    game.set_pod("a", True, 0.5, 256 * MI)
+    game.set_pod("b", True, 1.0, 512 * MI)
+    game.set_usage("a", 0.1, 10 * MI)
+    # b has no sample: half of its own limits, whatever a uses
+    assert game.totals() == pytest.approx(
+        (2, 0.1 + 1.0 * ESTIMATED_USAGE, 10 * MI + 512 * MI * ESTIMATED_USAGE, 1.5, 768 * MI))
+
+
+def test_totals_follow_updates_and_removals():
+    game = GameResources()
+    game.set_pod("a", True, 0.5, 256 * MI)
+    game.set_usage("a", 0.2, 50 * MI)
+    assert game.totals()[1] == pytest.approx(0.2)
+    game.set_usage("a", 0.4, 50 * MI)
+    assert game.totals()[1] == pytest.approx(0.4)
+    game.set_usage("a", None, None)
+    assert game.totals()[1] == pytest.approx(0.5 * ESTIMATED_USAGE)
+    game.remove_pod("a")
+    assert game.totals() == (0, 0.0, 0.0, 0.0, 0.0)
+    # A freed slot is reused without carrying over the old pod's values
+    game.set_pod("b", True, 1.0, 128 * MI)
+    assert game.totals() == pytest.approx((1, 1.0 * ESTIMATED_USAGE, 128 * MI * ESTIMATED_USAGE, 1.0, 128 * MI))
+
+
+def test_index_combines_pod_events_and_metrics():
+    index = ResourceIndex()
+    index.on_pod_event("ADDED", pod("a"))
+    index.on_pod_event("ADDED", pod("b", phase="Pending"))
+    index.on_metrics({"g1": {"a": [{"cpu": "100m", "memory": "64Mi"}]}})
+    assert index.totals("g1") == pytest.approx((1, 0.1, 64 * MI, 0.5, 256 * MI))
+    assert index.pod_cpu_usage("g1", "a") == pytest.approx(0.1)
+    assert index.pod_cpu_usage("g1", "b") is None
+
+    index.on_pod_event("MODIFIED", pod("b"))
+    assert index.totals("g1") == pytest.approx((2, 0.1 + 0.5 * ESTIMATED_USAGE,
+                                                64 * MI + 256 * MI * ESTIMATED_USAGE, 1.0, 512 * MI))
+
+    index.on_pod_event("DELETED", pod("a"))
+    index.on_pod_event("DELETED", pod("b"))
+    assert index.totals("g1") == (0, 0.0, 0.0, 0.0, 0.0)
+    assert "g1" not in index.games
+
+
+def test_index_ignores_unparseable_usage():
+    index = ResourceIndex()
+    index.on_pod_event("ADDED", pod("a"))
+    index.on_metrics({"g1": {"a": [{"cpu": "lots", "memory": "64Mi"}]}})
+    assert index.totals("g1")[1] == pytest.approx(0.5 * ESTIMATED_USAGE)
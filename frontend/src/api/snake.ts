@@ -6,18 +6,24 @@ const API = axios.create({
 });
 
 export interface WebSocketMessage {
-  type: "ADDED" | "MODIFIED" | "DELETED" | "CONNECTED" | "ERROR" | "METRICS";
+  type: "ADDED" | "MODIFIED" | "DELETED" | "CONNECTED" | "ERROR" | "METRICS" | "BATCH" | "SYNC";
   pod?: string;
   status?: string;
   cpu_percent?: number;
   memory_percent?: number;
   network_io?: string;
   requests_per_sec?: number;
+  target_requests_per_sec?: number;
+  load_errors?: number;
   running_pods?: number;
+  events?: WebSocketMessage[];
+  added?: { pod: string; status: string }[];
+  modified?: { pod: string; status: string }[];
+  deleted?: string[];
 }
 
-export const initGame = async (): Promise<{ status: string; game_id: string }> => {
-  const res = await API.post<{ status: string; game_id: string }>("/init");
+export const initGame = async (profile?: string): Promise<{ status: string; game_id: string }> => {
+  const res = await API.post<{ status: string; game_id: string }>("/init", null, { params: profile ? { profile } : {} });
   return res.data;
 };
 
@@ -31,14 +37,42 @@ export const generateLoad = async (game_id: string): Promise<{ status: string; g
   return res.data;
 };
 
+export interface MetricSeries {
+  min: number[];
+  max: number[];
+  avg: number[];
+}
+
+export interface MetricHistory {
+  game_id: string;
+  interval_seconds: number;
+  window_seconds: number;
+  bucket_seconds: number;
+  timestamps: number[];
+  samples: number[];
+  series: Record<"cpu_percent" | "memory_percent" | "running_pods" | "requests_per_sec", MetricSeries>;
+}
+
+// Downsampled metrics of the last `window` seconds, e.g. to backfill charts after reconnecting
+export const getHistory = async (game_id: string, window = 600, buckets = 60): Promise<MetricHistory> => {
+  const res = await API.get<MetricHistory>(`/history/${game_id}`, { params: { window, buckets } });
+  return res.data;
+};
+
+// Close code the backend uses for a client that fell behind. The game is
+// kept for a grace period; reconnect to keep playing.
+export const RECONNECT_CLOSE_CODE = 1013;
 
 export const createWebSocket = (
   game_id: string,
   onMessage: (data: WebSocketMessage) => void,
-  onError?: (error: unknown) => void
+  onError?: (error: unknown) => void,
+  spectate = false,
+  onReconnect?: () => void
 ): WebSocket => {
   // Convert http:// to ws:// or https:// to wss://
-  const wsUrl = API_BASE_URL.replace(/^http/, "ws") + `/stream/${game_id}`;
+  // Spectators watch the same game without ending it when they leave
+  const wsUrl = API_BASE_URL.replace(/^http/, "ws") + `/stream/${game_id}` + (spectate ? "?spectate=true" : "");
   const ws = new WebSocket(wsUrl);
 
   ws.onopen = () => {
@@ -60,7 +94,12 @@ export const createWebSocket = (
     if (onError) onError(error);
   };
 
-  ws.onclose = () => {
+  ws.onclose = (event: CloseEvent) => {
+    if (event.code === RECONNECT_CLOSE_CODE) {
+      console.log("WebSocket closed for falling behind, reconnecting");
+      if (onReconnect) onReconnect();
+      return;
+    }
     console.log("WebSocket disconnected");
   };
 
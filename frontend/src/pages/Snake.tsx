@@ -84,23 +84,40 @@ export default function Snake() {
   };
 
   const handleWebSocketMessage = () => {
-    return (data: WebSocketMessage) => {
+    const handle = (data: WebSocketMessage) => {
       const { type, pod, status } = data;
-      if (type === "ADDED") { 
+      if (type === "BATCH") {
+        // Several pod events merged into one frame by the backend
+        data.events?.forEach(handle);
+      } else if (type === "SYNC") {
+        // Backend re-listed pods after its watch expired, only the differences are sent
+        const deleted = new Set(data.deleted ?? []);
+        const updated = new Map([...(data.added ?? []), ...(data.modified ?? [])].map((p) => [p.pod, p.status]));
+        setLivePods((prev) => {
+          const kept = prev
+            .filter((p) => !deleted.has(p.name))
+            .map((p) => updated.has(p.name) ? { name: p.name, status: updated.get(p.name)! } : p);
+          const known = new Set(kept.map((p) => p.name));
+          const added = (data.added ?? []).filter((p) => !known.has(p.pod)).map((p) => ({ name: p.pod, status: p.status }));
+          return [...kept, ...added];
+        });
+      } else if (type === "ADDED") { 
         setLivePods((prev) => [...prev, { name: pod!, status: status! }]);
       } else if (type === "MODIFIED") {
         setLivePods((prev) => prev.map((p) => p.name === pod ? { name: pod!, status: status! } : p));
       } else if (type === "DELETED") {
         setLivePods((prev) => prev.filter((p) => p.name !== pod));
       } else if (type === "METRICS") {
-        setMetrics({
-          cpu_percent: data.cpu_percent || 0,
-          memory_percent: data.memory_percent || 0,
-          requests_per_sec: data.requests_per_sec || 0,
-          running_pods: data.running_pods || 0
-        });
+        // METRICS frames only carry the fields that changed since the last one
+        setMetrics((prev) => ({
+          cpu_percent: data.cpu_percent ?? prev?.cpu_percent ?? 0,
+          memory_percent: data.memory_percent ?? prev?.memory_percent ?? 0,
+          requests_per_sec: data.requests_per_sec ?? prev?.requests_per_sec ?? 0,
+          running_pods: data.running_pods ?? prev?.running_pods ?? 0
+        }));
       }
     };
+    return handle;
   };
 
 